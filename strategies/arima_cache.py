@@ -0,0 +1,71 @@
+# Persistent cache for pmdarima.auto_arima
+#
+# The stepwise order search is by far the slowest part of the ARIMA strategies. The
+# selected orders and the fitted model are stored per pair, timeframe, data and search
+# settings, so reruns of the same config skip model selection entirely.
+
+import pmdarima as pmd
+
+from disk_cache import DiskCache, array_fingerprint, make_key
+
+ARIMA_CACHE = DiskCache('data/cache/arima', max_entries=64)
+
+
+def arima_cache_key(close, pair=None, timeframe=None, search=pmd.auto_arima, **search_settings) -> str:
+    """
+    :param close: close prices the model is fitted on
+    :type close: Series
+    :param pair: e.g. "ETH/USDT", optional since the data fingerprint already identifies the pair
+    :type pair: str
+    :param timeframe: e.g. "5m"
+    :type timeframe: str
+    :param search: order search function
+    :type search: callable
+    :param search_settings: keyword arguments passed to the search
+    :return: cache key
+    :rtype: str
+    """
+    data_range = (str(close.index[0]), str(close.index[-1])) if len(close) else ()
+    return make_key(search.__module__, search.__name__, pair, timeframe, len(close), data_range,
+                    array_fingerprint(close.values), sorted(search_settings.items()))
+
+
+def cached_auto_arima(close, pair=None, timeframe=None, cache=ARIMA_CACHE, invalidate=False,
+                      search=pmd.auto_arima, **search_settings):
+    """
+    Drop-in replacement for pmd.auto_arima(close, **search_settings) that remembers its result.
+    Other searches with the same signature, e.g. arima_search.seasonal_order_search, can be cached too.
+
+    :param close: close prices to fit on
+    :type close: Series
+    :param pair: e.g. "ETH/USDT"
+    :type pair: str
+    :param timeframe: e.g. "5m"
+    :type timeframe: str
+    :param cache: where results are kept
+    :type cache: DiskCache
+    :param invalidate: ignore and replace a cached result
+    :type invalidate: bool
+    :param search: order search function
+    :type search: callable
+    :param search_settings: keyword arguments passed to the search
+    :return: fitted model
+    :rtype: pmdarima.ARIMA
+    """
+    key = arima_cache_key(close, pair, timeframe, search, **search_settings)
+    if invalidate:
+        cache.invalidate(key)
+    else:
+        entry = cache.get(key)
+        if entry is not None:
+            return entry['model']
+
+    arima_model = search(close, **search_settings)
+    cache.set(key, {
+        'order': arima_model.order,
+        'seasonal_order': arima_model.seasonal_order,
+        'params': dict(zip(arima_model.arima_res_.model.param_names, arima_model.params())),
+        'model': arima_model,
+    })
+
+    return arima_model
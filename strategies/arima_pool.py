@@ -0,0 +1,110 @@
+# Fits the ARIMA forecasts of all pairs in parallel
+#
+# Per pair fits are independent and CPU bound, so they are fanned out to a process pool
+# sized to the machine. Run this stage on the frames of all pairs before the per pair
+# flow, e.g. through the prepare_pairs hook of the ARIMA strategies. A forecast column is
+# stamped with the forecaster and a fingerprint of the closes it was fitted on, the
+# strategies only fit again when the frame has no forecast of its current closes.
+# The workers run BLAS, OpenMP and statsmodels single threaded, the pool already keeps
+# every CPU busy and more threads per process would only compete for them.
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:  # optional, without it only thread pools started after the fork are limited
+    threadpool_limits = None
+
+from indicator_cache import INDICATOR_CACHE
+from indicator_graph import STAMPS
+
+
+def pool_size(tasks: int, max_workers: int = None) -> int:
+    """
+    :param tasks: number of independent tasks
+    :type tasks: int
+    :param max_workers: upper bound, defaults to the number of CPUs
+    :type max_workers: int
+    :return: number of worker processes to start
+    :rtype: int
+    """
+    return max(1, min(tasks, max_workers or os.cpu_count() or 1))
+
+
+def limit_threads(threads: int = 1):
+    """
+    Process pool initializer, limits the BLAS and OpenMP thread pools of the worker.
+
+    :param threads: threads per pool
+    :type threads: int
+    """
+    # libraries loaded from now on, and processes started by the worker, read these
+    for variable in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+                     'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_MAX_THREADS', 'NUMEXPR_NUM_THREADS'):
+        os.environ[variable] = str(threads)
+    # pools already loaded in the parent before the fork
+    if threadpool_limits is not None:
+        threadpool_limits(threads)
+
+
+def fit_forecasts(dataframes: dict, forecaster, max_workers: int = None, column: str = 'forecast') -> dict:
+    """
+    :param dataframes: OHLCV data per pair, e.g. {"ETH/USDT": DataFrame}
+    :type dataframes: dict
+    :param forecaster: module level function mapping a close Series to a forecast array,
+                       e.g. pmd_sarima_strategy.arima_forecast
+    :type forecaster: callable
+    :param max_workers: upper bound for the pool size
+    :type max_workers: int
+    :param column: column the forecast is written to
+    :type column: str
+    :return: the same dataframes, each with the forecast column filled in
+    :rtype: dict
+    """
+    missing = {pair: dataframe for pair, dataframe in dataframes.items()
+               if not has_forecast(dataframe, forecaster, column)}
+    if not missing:
+        return dataframes
+
+    with ProcessPoolExecutor(pool_size(len(missing), max_workers), initializer=limit_threads) as pool:
+        futures = {pair: pool.submit(forecaster, dataframe['close']) for pair, dataframe in missing.items()}
+        for pair, future in futures.items():
+            _store(dataframes[pair], forecaster, column, future.result())
+
+    return dataframes
+
+
+def add_forecast(dataframe, forecaster, column: str = 'forecast'):
+    """
+    :param dataframe: OHLCV data of one pair
+    :type dataframe: DataFrame
+    :param forecaster: function mapping a close Series to a forecast array
+    :type forecaster: callable
+    :param column: column the forecast is written to
+    :type column: str
+    :return: the same dataframe with the forecast of its current closes, fitted here unless fit_forecasts did
+    :rtype: DataFrame
+    """
+    if not has_forecast(dataframe, forecaster, column):
+        _store(dataframe, forecaster, column, forecaster(dataframe['close']))
+    return dataframe
+
+
+def has_forecast(dataframe, forecaster, column: str = 'forecast') -> bool:
+    """
+    :return: whether the column holds the forecast of forecaster for the current closes
+    :rtype: bool
+    """
+    return column in dataframe and dataframe.attrs.get(STAMPS, {}).get(column) == _stamp(dataframe, forecaster)
+
+
+def _stamp(dataframe, forecaster) -> tuple:
+    return f'{forecaster.__module__}.{forecaster.__qualname__}', INDICATOR_CACHE.fingerprint(dataframe, 'close')
+
+
+def _store(dataframe, forecaster, column, forecast):
+    dataframe[column] = np.asarray(forecast)
+    dataframe.attrs.setdefault(STAMPS, {})[column] = _stamp(dataframe, forecaster)
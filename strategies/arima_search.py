@@ -0,0 +1,159 @@
+# Parallel exhaustive (non-stepwise) SARIMA order search
+#
+# Evaluates the same candidate grid as pmd.auto_arima(..., stepwise=False), but spreads
+# the fits over worker processes and skips candidates that can not beat the best
+# information criterion found so far.
+#
+# Early cutoff: a candidate nested in an already fitted model can not reach a higher
+# log likelihood than that model, so -2 * llf(supermodel) + penalty(candidate) is a lower
+# bound for its information criterion. Candidates whose bound is above the current best
+# are never fitted. Fitting the largest models first makes these bounds available early.
+# The bound only holds when the optimizer found the maximum likelihood of the supermodel:
+# fits that did not converge are never used as a bound, but a converged fit that stopped
+# in a local optimum can still cut off the model the exhaustive search would pick. The
+# cutoff is therefore off by default, pass early_cutoff=True to trade that risk for speed.
+
+import math
+import warnings
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pmdarima as pmd
+from numpy.linalg import LinAlgError
+
+from arima_pool import limit_threads, pool_size
+
+
+def _penalty(information_criterion: str, params: int, nobs: int) -> float:
+    if information_criterion == 'aic':
+        return 2 * params
+    if information_criterion == 'aicc':
+        return 2 * params + 2 * params * (params + 1) / max(nobs - params - 1, 1)
+    if information_criterion == 'bic':
+        return params * math.log(nobs)
+    if information_criterion == 'hqic':
+        return 2 * params * math.log(math.log(nobs))
+    raise ValueError(f"Unknown information criterion: {information_criterion}")
+
+
+def _nested(inner, outer) -> bool:
+    return all(i <= o for i, o in zip(inner, outer))
+
+
+def _fit_candidate(y, order, seasonal_order, with_intercept, information_criterion, fit_kwargs):
+    """
+    Fits one candidate, module level so it can run in a worker process.
+    Mirrors pmdarima: failed fits and near non-invertible models get an infinite criterion.
+    """
+    model = pmd.ARIMA(order=order, seasonal_order=seasonal_order, with_intercept=with_intercept,
+                      suppress_warnings=True, **fit_kwargs)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            model.fit(y)
+    except (LinAlgError, ValueError):
+        return None
+
+    ic = getattr(model, information_criterion)()
+    p, _, q = order
+    P, _, Q, _ = seasonal_order
+    inverse_roots = [0.0]
+    if p + P > 0:
+        inverse_roots.extend(np.abs(1 / model.arroots()))
+    if q + Q > 0 and np.isfinite(ic):
+        inverse_roots.extend(np.abs(1 / model.maroots()))
+    if max(inverse_roots) > 1 - 1e-2:
+        ic = np.inf
+
+    converged = bool((model.arima_res_.mle_retvals or {}).get('converged', False))
+    return model.arima_res_.llf, ic, model.arima_res_.nobs_effective, converged
+
+
+def seasonal_order_search(y, m, d, D, max_p=5, max_q=5, max_P=2, max_Q=2, max_order=5,
+                          information_criterion='aic', with_intercept='auto', max_workers=None,
+                          early_cutoff=False, start_p=0, start_q=0, start_P=0, start_Q=0, **fit_kwargs):
+    """
+    :param y: series to fit, e.g. the close prices
+    :type y: Series
+    :param m: seasonal period
+    :type m: int
+    :param d: order of differencing
+    :type d: int
+    :param D: order of seasonal differencing
+    :type D: int
+    :param max_p: largest AR order
+    :param max_q: largest MA order
+    :param max_P: largest seasonal AR order
+    :param max_Q: largest seasonal MA order
+    :param max_order: largest p + q + P + Q
+    :param information_criterion: "aic", "aicc", "bic" or "hqic"
+    :type information_criterion: str
+    :param with_intercept: True, False or "auto" (intercept when d + D is 0 or 1, like pmdarima)
+    :param max_workers: upper bound for the pool size
+    :type max_workers: int
+    :param early_cutoff: skip candidates that can not beat the best model found so far, a heuristic, see above
+    :type early_cutoff: bool
+    :param start_p: smallest AR order, pmd.auto_arima(stepwise=False) ignores its start_* and starts at 0
+    :param start_q: smallest MA order
+    :param start_P: smallest seasonal AR order
+    :param start_Q: smallest seasonal MA order
+    :param fit_kwargs: passed on to pmd.ARIMA, e.g. method or maxiter
+    :return: best model, fitted on y
+    :rtype: pmdarima.ARIMA
+    """
+    if with_intercept == 'auto':
+        with_intercept = (d + D) in (0, 1)
+
+    # (p, q, P, Q) in the same order as pmdarima, ties keep the first candidate
+    candidates = [(p, q, P, Q)
+                  for p in range(start_p, max_p + 1)
+                  for q in range(start_q, max_q + 1)
+                  for P in range(start_P, max_P + 1)
+                  for Q in range(start_Q, max_Q + 1)
+                  if p + q + P + Q <= max_order]
+    # sigma2 and the intercept come on top of the ARMA coefficients
+    extra_params = 1 + int(with_intercept)
+
+    fitted = {}
+    best = (np.inf, len(candidates), None)
+
+    def lower_bound(candidate):
+        bounds = [-2 * llf + _penalty(information_criterion, sum(candidate) + extra_params, nobs)
+                  for outer, (llf, nobs) in fitted.items() if _nested(candidate, outer)]
+        return max(bounds, default=-np.inf)
+
+    # largest models first, they bound everything nested in them
+    queue = sorted(range(len(candidates)), key=lambda index: (-sum(candidates[index]), index))
+
+    workers = pool_size(len(candidates), max_workers)
+    with ProcessPoolExecutor(workers, initializer=limit_threads) as pool:
+        pending = {}
+        while queue or pending:
+            while queue and len(pending) < workers:
+                index = queue.pop(0)
+                if early_cutoff and lower_bound(candidates[index]) > best[0]:
+                    continue
+                p, q, P, Q = candidates[index]
+                future = pool.submit(_fit_candidate, y, (p, d, q), (P, D, Q, m), with_intercept,
+                                     information_criterion, fit_kwargs)
+                pending[future] = index
+
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                result = future.result()
+                if result is None:
+                    continue
+                llf, ic, nobs, converged = result
+                if converged:
+                    fitted[candidates[index]] = (llf, nobs)
+                best = min(best, (ic, index, candidates[index]))
+
+    if best[2] is None:
+        raise ValueError("Could not successfully fit a viable ARIMA model")
+
+    p, q, P, Q = best[2]
+    return pmd.ARIMA(order=(p, d, q), seasonal_order=(P, D, Q, m), with_intercept=with_intercept,
+                     suppress_warnings=True, **fit_kwargs).fit(y)
@@ -0,0 +1,179 @@
+# State space form of a fitted (S)ARIMA model
+#
+# The orders and parameters are fixed once, after that every new close advances a
+# Kalman filter in constant time. Refitting (what pmdarima's update does) is not needed
+# to get one-step-ahead forecasts.
+
+from collections import deque
+
+import numpy as np
+from numpy.polynomial import polynomial
+from statsmodels.tsa.arima.model import ARIMA
+from statsmodels.tsa.statespace.tools import prepare_trend_spec
+
+
+class ArimaStateSpace:
+    """
+    Kalman filter for phi(L) (w_t - mu) = theta(L) e_t, with w_t the differenced close.
+    The state is kept in Harvey form, which has max(p, q + 1) entries.
+    """
+
+    def __init__(self, ar=(), ma=(), diff=(1.0,), intercept=0.0, mean=0.0):
+        """
+        :param ar: AR coefficients phi_1..phi_p, seasonal terms already multiplied in
+        :type ar: sequence
+        :param ma: MA coefficients theta_1..theta_q, seasonal terms already multiplied in
+        :type ma: sequence
+        :param diff: coefficients of the differencing polynomial (1 - L)^d (1 - L^m)^D, lag 0 first
+        :type diff: sequence
+        :param intercept: constant on the right hand side of the ARMA equation (SARIMAX "intercept")
+        :type intercept: float
+        :param mean: mean of the differenced series (ARIMA "const")
+        :type mean: float
+        """
+        ar = np.asarray(ar, dtype=float)
+        ma = np.asarray(ma, dtype=float)
+        self.diff = np.asarray(diff, dtype=float)
+        self.mean = mean + intercept / (1 - ar.sum())
+
+        size = max(len(ar), len(ma) + 1)
+        self.transition = np.zeros((size, size))
+        self.transition[:len(ar), 0] = ar
+        self.transition[:-1, 1:] = np.eye(size - 1)
+        self.selection = np.zeros(size)
+        self.selection[0] = 1
+        self.selection[1:len(ma) + 1] = ma
+        self.state_cov = np.outer(self.selection, self.selection)
+
+        self.reset()
+
+    @classmethod
+    def from_results(cls, results):
+        """
+        :param results: fitted statsmodels SARIMAX or ARIMA results
+        :return: state space model with the fitted orders and parameters
+        :rtype: ArimaStateSpace
+        """
+        model = results.model
+        lags = {'ar.L': {}, 'ar.S.L': {}, 'ma.L': {}, 'ma.S.L': {}}
+        intercept = 0.0
+        # ARIMA puts its trend terms b * t^power first, as regressors on the undifferenced closes
+        powers = np.flatnonzero(prepare_trend_spec(model.trend)[0]) if isinstance(model, ARIMA) else []
+        trends = dict(zip(model.param_names[:len(powers)], powers))
+        trend = {}
+        for name, value in zip(model.param_names, np.asarray(results.params, dtype=float)):
+            if name in trends:
+                trend[trends[name]] = value
+            elif name == 'intercept':
+                intercept = value
+            elif name == 'sigma2':
+                # the point forecasts do not depend on the innovation variance
+                continue
+            else:
+                prefix, _, lag = name.rpartition('L')
+                if prefix + 'L' not in lags or not lag.isdigit():
+                    raise ValueError(f"Unsupported ARIMA parameter: {name}")
+                lags[prefix + 'L'][int(lag)] = value
+
+        def lag_polynomial(coefficients, sign):
+            poly = np.zeros(max(coefficients, default=0) + 1)
+            poly[0] = 1
+            for lag, value in coefficients.items():
+                poly[lag] = sign * value
+            return poly
+
+        ar_poly = polynomial.polymul(lag_polynomial(lags['ar.L'], -1), lag_polynomial(lags['ar.S.L'], -1))
+        ma_poly = polynomial.polymul(lag_polynomial(lags['ma.L'], 1), lag_polynomial(lags['ma.S.L'], 1))
+
+        diff = np.array([1.0])
+        for _ in range(model.k_diff):
+            diff = polynomial.polymul(diff, [1, -1])
+        seasonal_step = np.zeros(model.seasonal_periods + 1)
+        seasonal_step[[0, -1]] = 1, -1
+        for _ in range(model.k_seasonal_diff):
+            diff = polynomial.polymul(diff, seasonal_step)
+
+        # differencing turns a trend of the closes of degree d + D into a constant mean
+        mean = 0.0
+        for power, value in trend.items():
+            differenced = [diff @ (time - np.arange(len(diff), dtype=float)) ** power
+                           for time in (len(diff), 2 * len(diff))]
+            if not np.isclose(*differenced):
+                raise ValueError(f"Unsupported ARIMA trend: t^{power} with {model.k_diff + model.k_seasonal_diff} differences")
+            mean += value * differenced[0]
+
+        return cls(ar=-ar_poly[1:], ma=ma_poly[1:], diff=diff, intercept=intercept, mean=mean)
+
+    @classmethod
+    def from_pmdarima(cls, arima_model):
+        """
+        :param arima_model: fitted pmdarima ARIMA, e.g. the result of pmd.auto_arima
+        :return: state space model with the fitted orders and parameters
+        :rtype: ArimaStateSpace
+        """
+        return cls.from_results(arima_model.arima_res_)
+
+    def reset(self):
+        """
+        Forgets all observed closes and starts again from the stationary distribution.
+        """
+        size = len(self.selection)
+        self.state = np.zeros(size)
+        self.converged = False
+        self.closes = deque(maxlen=len(self.diff))
+
+        transition = self.transition
+        if np.all(np.abs(np.linalg.eigvals(transition)) < 1):
+            # solve P = T P T' + R R' for the unconditional state covariance
+            lhs = np.eye(size * size) - np.kron(transition, transition)
+            self.cov = np.linalg.solve(lhs, self.state_cov.ravel()).reshape(size, size)
+        else:
+            # non-stationary AR part, start diffuse
+            self.cov = np.eye(size) * 1e6
+
+    def update(self, close):
+        """
+        Advances the filter by one candle.
+
+        :param close: newest close
+        :type close: float
+        :return: forecast of the next close, NaN while the differencing window fills up
+        :rtype: float
+        """
+        self.closes.appendleft(close)
+        if len(self.closes) < len(self.diff):
+            return np.nan
+
+        recent = np.fromiter(self.closes, dtype=float, count=len(self.closes))
+        innovation = self.diff @ recent - self.mean - self.state[0]
+
+        transition, cov = self.transition, self.cov
+        if np.isnan(innovation):
+            self.state = transition @ self.state
+            if not self.converged:
+                self.cov = transition @ cov @ transition.T + self.state_cov
+        else:
+            gain = transition @ cov[:, 0] / cov[0, 0]
+            self.state = transition @ self.state + gain * innovation
+            if not self.converged:
+                self.cov = transition @ cov @ transition.T + self.state_cov - np.outer(gain, gain) * cov[0, 0]
+                # steady state reached, the gain stays constant from here on
+                self.converged = np.allclose(self.cov, cov, rtol=0, atol=1e-12)
+
+        # undo the differencing: y_t+1 = w_t+1 - sum diff_k y_t+1-k
+        return self.mean + self.state[0] - self.diff[1:] @ recent[:-1]
+
+    def filter(self, closes):
+        """
+        Runs the filter over a whole close array in one call.
+
+        :param closes: closes, oldest first
+        :type closes: ndarray
+        :return: one-step-ahead forecast for every close, i.e. the forecast of the close after it
+        :rtype: ndarray
+        """
+        closes = np.asarray(closes, dtype=float)
+        forecast = np.empty(len(closes))
+        for index, close in enumerate(closes):
+            forecast[index] = self.update(close)
+        return forecast
@@ -0,0 +1,75 @@
+# Walk-forward ARIMA forecasting
+#
+# The model is refitted every refit_every candles on the history up to that candle, warm
+# started from the previous parameters. Between refits the fitted state is extended one
+# candle at a time with ArimaStateSpace, which is O(1) per candle. refit_every is the one
+# setting that trades forecast freshness against CPU time.
+
+import warnings
+
+import numpy as np
+from statsmodels.tsa.arima.model import ARIMA
+
+from arima_state_space import ArimaStateSpace
+
+
+def arima_trend(with_intercept: bool, d: int, D: int = 0):
+    """
+    pmdarima fits its intercept on the differenced series. statsmodels' ARIMA takes trends of
+    the undifferenced series, the same model then has a trend of degree d + D: a constant for
+    d + D = 0, a drift for d + D = 1.
+
+    :param with_intercept: e.g. arima_model.with_intercept of a fitted pmdarima model
+    :type with_intercept: bool
+    :param d: order of differencing
+    :type d: int
+    :param D: order of seasonal differencing
+    :type D: int
+    :return: trend argument for statsmodels' ARIMA
+    :rtype: str or list
+    """
+    if not with_intercept:
+        return 'n'
+    return {0: 'c', 1: 't'}.get(d + D, [0] * (d + D) + [1])
+
+
+def walk_forward_forecast(close, order, seasonal_order=(0, 0, 0, 0), trend=None, refit_every=288,
+                          min_train=288, train_window=None, warmup=200) -> np.ndarray:
+    """
+    :param close: close prices, oldest first
+    :type close: Series
+    :param order: (p, d, q)
+    :type order: tuple
+    :param seasonal_order: (P, D, Q, m)
+    :type seasonal_order: tuple
+    :param trend: statsmodels ARIMA trend, None for its default, see arima_trend for pmdarima models
+    :type trend: str
+    :param refit_every: candles between refits, 288 is one day of 5m candles
+    :type refit_every: int
+    :param min_train: candles needed before the first fit, earlier forecasts are NaN
+    :type min_train: int
+    :param train_window: fit on at most this many of the latest candles, None for all of them
+    :type train_window: int
+    :param warmup: candles the filter replays before a refit point to settle its state
+    :type warmup: int
+    :return: one-step-ahead forecast per candle, using only the candles up to and including it
+    :rtype: ndarray
+    """
+    y = np.asarray(close, dtype=float)
+    forecast = np.full(len(y), np.nan)
+    params = None
+
+    for refit in range(min_train, len(y), refit_every):
+        train = y[max(0, refit - train_window) if train_window else 0:refit]
+        with warnings.catch_warnings():
+            # convergence warnings on short windows are expected
+            warnings.simplefilter('ignore')
+            results = ARIMA(train, order=order, seasonal_order=seasonal_order, trend=trend).fit(start_params=params)
+        params = results.params
+
+        # replay a few candles to settle the filter, then extend it up to the next refit
+        begin, stop = max(0, refit - warmup), min(refit + refit_every, len(y))
+        filtered = ArimaStateSpace.from_results(results).filter(y[begin:stop])
+        forecast[refit:stop] = filtered[refit - begin:]
+
+    return forecast
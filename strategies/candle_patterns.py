@@ -0,0 +1,232 @@
+# Compact candlestick pattern representation
+#
+# Every candle gets one uint64 bitmask for bull hits and one for bear hits.
+# Bit i belongs to CANDLE_NAMES[i], which follows the TA-Lib "Pattern Recognition"
+# order (alphabetical) so ties in candle_rankings resolve the same way as before.
+
+import numpy as np
+import talib as ta
+import talib.abstract as ta_abstract
+
+from candle_rankings import candle_rankings
+from indicator_executor import INDICATOR_EXECUTOR
+
+# ranked patterns only, see Note - 2 in candle_rankings for the excluded ones
+CANDLE_NAMES = sorted({label.rsplit('_', 1)[0] for label in candle_rankings})
+PATTERN_BITS = {candle: bit for bit, candle in enumerate(CANDLE_NAMES)}
+
+BULL_LABELS = np.array([candle + '_Bull' for candle in CANDLE_NAMES], dtype=object)
+BEAR_LABELS = np.array([candle + '_Bear' for candle in CANDLE_NAMES], dtype=object)
+
+# candle_rankings precompiled into arrays aligned with the bit positions
+BULL_RANKS = np.array([candle_rankings[label] for label in BULL_LABELS], dtype=np.int16)
+BEAR_RANKS = np.array([candle_rankings[label] for label in BEAR_LABELS], dtype=np.int16)
+NO_MATCH_RANK = np.int16(max(BULL_RANKS.max(), BEAR_RANKS.max()) + 1)
+
+# number of set bits for every possible byte value
+_POPCOUNT = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+_CHUNK_SIZE = 65536
+
+# candles a pattern can look back at, including the TA-Lib body/shadow averages
+LOOKBACK = max(ta_abstract.Function(candle).lookback for candle in CANDLE_NAMES)
+
+assert len(CANDLE_NAMES) <= 64, "pattern masks only hold 64 patterns"
+
+
+def compute_patterns(op, hi, lo, cl, executor=INDICATOR_EXECUTOR):
+    """
+    Runs every ranked TA-Lib pattern function and packs the results into bitmasks.
+    Only one pattern output per thread is alive at a time, the per-pattern columns are never stored.
+
+    :param op: open prices
+    :type op: ndarray
+    :param hi: high prices
+    :type hi: ndarray
+    :param lo: low prices
+    :type lo: ndarray
+    :param cl: close prices
+    :type cl: ndarray
+    :param executor: threads the pattern functions are spread over, each packs its own masks
+    :type executor: IndicatorExecutor
+    :return: bull and bear uint64 masks, one entry per candle
+    :rtype: tuple
+    """
+    def pack(bits):
+        bull = np.zeros(len(cl), dtype=np.uint64)
+        bear = np.zeros(len(cl), dtype=np.uint64)
+        for bit in bits:
+            signal = getattr(ta, CANDLE_NAMES[bit])(op, hi, lo, cl)
+            flag = np.uint64(1) << np.uint64(bit)
+            np.bitwise_or(bull, flag, out=bull, where=signal > 0)
+            np.bitwise_or(bear, flag, out=bear, where=signal < 0)
+        return bull, bear
+
+    # interleaved chunks, the slow multi candle patterns are not all in one chunk
+    parts = min(executor.max_workers, len(CANDLE_NAMES))
+    masks = executor.map(pack, [range(start, len(CANDLE_NAMES), parts) for start in range(parts)])
+    bull, bear = masks[0]
+    for other_bull, other_bear in masks[1:]:
+        bull |= other_bull
+        bear |= other_bear
+    return bull, bear
+
+
+def has_pattern(mask, candle):
+    """
+    :param mask: bull or bear masks
+    :type mask: ndarray
+    :param candle: TA-Lib pattern function name, e.g. "CDLHAMMER"
+    :type candle: str
+    :return: True for every candle on which the pattern matched
+    :rtype: ndarray
+    """
+    flag = np.uint64(1) << np.uint64(PATTERN_BITS[candle])
+    return (np.asarray(mask, dtype=np.uint64) & flag) != 0
+
+
+def count_patterns(bull, bear):
+    """
+    :param bull: bull masks
+    :type bull: ndarray
+    :param bear: bear masks
+    :type bear: ndarray
+    :return: number of matched patterns per candle
+    :rtype: ndarray
+    """
+    combined = np.ascontiguousarray(np.asarray(bull, dtype=np.uint64) | np.asarray(bear, dtype=np.uint64))
+    return _POPCOUNT[combined.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.int64)
+
+
+def decode_patterns(bull, bear):
+    """
+    :param bull: bull mask of a single candle
+    :type bull: int
+    :param bear: bear mask of a single candle
+    :type bear: int
+    :return: labels of all matched patterns, e.g. ["CDLHAMMER_Bull", "CDLDOJI_Bear"]
+    :rtype: list
+    """
+    bull, bear = int(bull), int(bear)
+    labels = []
+    for bit, candle in enumerate(CANDLE_NAMES):
+        if bull >> bit & 1:
+            labels.append(BULL_LABELS[bit])
+        elif bear >> bit & 1:
+            labels.append(BEAR_LABELS[bit])
+    return labels
+
+
+def _unpack(mask):
+    # (candles x 64) booleans, little-endian so column i is bit i
+    mask = np.ascontiguousarray(mask, dtype='<u8')
+    return np.unpackbits(mask.view(np.uint8).reshape(-1, 8), axis=1, bitorder='little')[:, :len(CANDLE_NAMES)] != 0
+
+
+def best_patterns(bull, bear):
+    """
+    Resolves the best performing pattern for every candle.
+    The lowest candle_rankings rank wins, ties go to the first pattern in CANDLE_NAMES.
+    Work is done in chunks, so memory stays flat for millions of candles.
+
+    :param bull: bull masks
+    :type bull: ndarray
+    :param bear: bear masks
+    :type bear: ndarray
+    :return: best pattern label ("NO_PATTERN" if none) and number of matched patterns per candle
+    :rtype: tuple
+    """
+    bull = np.asarray(bull, dtype=np.uint64)
+    bear = np.asarray(bear, dtype=np.uint64)
+    patterns = np.empty(len(bull), dtype=object)
+
+    for start in range(0, len(bull), _CHUNK_SIZE):
+        stop = start + _CHUNK_SIZE
+        bull_bits = _unpack(bull[start:stop])
+        bear_bits = _unpack(bear[start:stop])
+
+        ranks = np.where(bull_bits, BULL_RANKS, np.where(bear_bits, BEAR_RANKS, NO_MATCH_RANK))
+        best = ranks.argmin(axis=1)
+        is_bull = np.take_along_axis(bull_bits, best[:, np.newaxis], axis=1)[:, 0]
+        patterns[start:stop] = np.where(is_bull, BULL_LABELS[best], BEAR_LABELS[best])
+
+    match_count = count_patterns(bull, bear)
+    patterns[match_count == 0] = 'NO_PATTERN'
+
+    return patterns, match_count
+
+
+class PatternTracker:
+    """
+    Keeps pattern masks and best pattern results for a growing candle history.
+    Every update only evaluates the appended candles plus a LOOKBACK buffer in front of them,
+    so replaying a history candle by candle costs O(1) per candle instead of O(n).
+
+    The last candle is treated as unfinished and is evaluated again on the next update.
+    Of the candles only the last LOOKBACK finished ones are kept, the only ones the next
+    candles are evaluated with. If they no longer line up with the history, everything is
+    recomputed.
+    """
+
+    def __init__(self):
+        self.committed = 0
+        # open, high, low and close of the last LOOKBACK finished candles
+        self.tail = np.zeros((4, 0))
+        self.bull = np.zeros(0, dtype=np.uint64)
+        self.bear = np.zeros(0, dtype=np.uint64)
+        self.patterns = np.empty(0, dtype=object)
+        self.match_count = np.zeros(0, dtype=np.int64)
+
+    def _reserve(self, size):
+        if size <= len(self.bull):
+            return
+        capacity = max(size, 2 * len(self.bull))
+        for name in ('bull', 'bear', 'patterns', 'match_count'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def update(self, op, hi, lo, cl):
+        """
+        :param op: open prices of the full history
+        :type op: ndarray
+        :param hi: high prices of the full history
+        :type hi: ndarray
+        :param lo: low prices of the full history
+        :type lo: ndarray
+        :param cl: close prices of the full history
+        :type cl: ndarray
+        :return: bull masks, bear masks, best patterns and match counts for the full history, views
+                 of the tracker's buffers that the next update may change, e.g. DataFrame columns copy them
+        :rtype: tuple
+        """
+        size = len(cl)
+        if self.committed:
+            tail_start = self.committed - self.tail.shape[1]
+            if size < self.committed or not np.array_equal(
+                    _rows(op, hi, lo, cl, tail_start, self.committed), self.tail, equal_nan=True):
+                self.committed = 0
+
+        start = self.committed
+        if start < size:
+            buffer_start = max(0, start - LOOKBACK)
+            bull, bear = compute_patterns(op[buffer_start:size], hi[buffer_start:size],
+                                          lo[buffer_start:size], cl[buffer_start:size])
+            bull, bear = bull[start - buffer_start:], bear[start - buffer_start:]
+            patterns, match_count = best_patterns(bull, bear)
+
+            self._reserve(size)
+            self.bull[start:size] = bull
+            self.bear[start:size] = bear
+            self.patterns[start:size] = patterns
+            self.match_count[start:size] = match_count
+
+        # everything up to the last candle is final
+        self.committed = max(size - 1, 0)
+        self.tail = _rows(op, hi, lo, cl, max(0, self.committed - LOOKBACK), self.committed)
+
+        return self.bull[:size], self.bear[:size], self.patterns[:size], self.match_count[:size]
+
+
+def _rows(op, hi, lo, cl, start, stop):
+    return np.array([op[start:stop], hi[start:stop], lo[start:stop], cl[start:stop]], dtype=float)
@@ -1,11 +1,11 @@
 # Mandatory Imports
+from collections import OrderedDict
+
 from pandas import DataFrame
 
 # Optional Imports
-import talib as ta
-import numpy as np
-from candle_rankings import candle_rankings
-from itertools import compress
+from candle_patterns import compute_patterns, best_patterns, PatternTracker
+from indicator_graph import COMMON_INDICATORS, IndicatorGraph, IndicatorNode
 
 from backtesting.strategy import Strategy
 
@@ -15,73 +15,53 @@ class CandlestickRecognitionStrategy(Strategy):
     This is an example custom strategy for advanced users, that inherits from the main Strategy class
     """
 
+    indicators = COMMON_INDICATORS + [
+        # TRIX
+        IndicatorNode('trix', 'TRIX', timeperiod=21),
+    ]
+
+    # only evaluate appended candles when generate_indicators is called with a growing history
+    incremental_patterns = True
+    # histories a tracker is kept for, least recently used ones are dropped
+    max_pattern_trackers = 64
+
+    def pattern_tracker(self, df) -> PatternTracker:
+        """
+        Returns the PatternTracker for the history df belongs to, keyed by its first candle.
+        """
+        trackers = self.__dict__.setdefault('pattern_trackers', OrderedDict())
+        first = df.iloc[0]
+        key = (df.index[0], first['open'], first['close'])
+        tracker = trackers.setdefault(key, PatternTracker())
+        trackers.move_to_end(key)
+        while len(trackers) > self.max_pattern_trackers:
+            trackers.popitem(last=False)
+        return tracker
+
     def recognize_candlestick(self, df):
         """
-        Recognizes candlestick patterns and appends 2 additional columns to df;
+        Recognizes candlestick patterns and appends 4 additional columns to df;
         1st - Best Performance candlestick pattern matched by www.thepatternsite.com
         2nd - # of matched patterns
+        3rd/4th - bull/bear pattern bitmasks, see candle_patterns
         """
 
-        op = df['open'].astype(float)
-        hi = df['high'].astype(float)
-        lo = df['low'].astype(float)
-        cl = df['close'].astype(float)
-
-        candle_names = ta.get_function_groups()['Pattern Recognition']
-
-        # patterns not found in the patternsite.com
-        exclude_items = ('CDLCOUNTERATTACK',
-                         'CDLLONGLINE',
-                         'CDLSHORTLINE',
-                         'CDLSTALLEDPATTERN',
-                         'CDLKICKINGBYLENGTH')
-
-        candle_names = [candle for candle in candle_names if candle not in exclude_items]
-
-        # create columns for each candle
-        for candle in candle_names:
-            # below is same as;
-            # df["CDL3LINESTRIKE"] = talib.CDL3LINESTRIKE(op, hi, lo, cl)
-            df[candle] = getattr(ta, candle)(op, hi, lo, cl)
-
-        df['candlestick_pattern'] = np.nan
-        df['candlestick_match_count'] = np.nan
-        for index, row in df.iterrows():
-
-            # no pattern found
-            if len(row[candle_names]) - sum(row[candle_names] == 0) == 0:
-                df.loc[index, 'candlestick_pattern'] = "NO_PATTERN"
-                df.loc[index, 'candlestick_match_count'] = 0
-            # single pattern found
-            elif len(row[candle_names]) - sum(row[candle_names] == 0) == 1:
-                # bull pattern 100 or 200
-                if any(row[candle_names].values > 0):
-                    pattern = list(compress(row[candle_names].keys(), row[candle_names].values != 0))[0] + '_Bull'
-                    df.loc[index, 'candlestick_pattern'] = pattern
-                    df.loc[index, 'candlestick_match_count'] = 1
-                # bear pattern -100 or -200
-                else:
-                    pattern = list(compress(row[candle_names].keys(), row[candle_names].values != 0))[0] + '_Bear'
-                    df.loc[index, 'candlestick_pattern'] = pattern
-                    df.loc[index, 'candlestick_match_count'] = 1
-            # multiple patterns matched -- select best performance
-            else:
-                # filter out pattern names from bool list of values
-                patterns = list(compress(row[candle_names].keys(), row[candle_names].values != 0))
-                container = []
-                for pattern in patterns:
-                    if row[pattern] > 0:
-                        container.append(pattern + '_Bull')
-                    else:
-                        container.append(pattern + '_Bear')
-                rank_list = [candle_rankings[p] for p in container]
-                if len(rank_list) == len(container):
-                    rank_index_best = rank_list.index(min(rank_list))
-                    df.loc[index, 'candlestick_pattern'] = container[rank_index_best]
-                    df.loc[index, 'candlestick_match_count'] = len(container)
-        # clean up candle columns
-        cols_to_drop = candle_names + list(exclude_items)
-        #df.drop(cols_to_drop, axis=1, inplace=True)
+        op = df['open'].to_numpy(dtype=float)
+        hi = df['high'].to_numpy(dtype=float)
+        lo = df['low'].to_numpy(dtype=float)
+        cl = df['close'].to_numpy(dtype=float)
+
+        # one bull and one bear bitmask per candle instead of a column per pattern
+        if self.incremental_patterns and len(df):
+            bull, bear, patterns, match_count = self.pattern_tracker(df).update(op, hi, lo, cl)
+        else:
+            bull, bear = compute_patterns(op, hi, lo, cl)
+            patterns, match_count = best_patterns(bull, bear)
+
+        df['candlestick_bull'] = bull
+        df['candlestick_bear'] = bear
+        df['candlestick_pattern'] = patterns
+        df['candlestick_match_count'] = match_count
 
         return df
 
@@ -92,15 +72,7 @@ class CandlestickRecognitionStrategy(Strategy):
         :return: Dataframe filled with indicator-data
         :rtype: DataFrame
         """
-        # RSI - Relative Strength Index
-        dataframe['rsi'] = ta.RSI(dataframe['close'], timeperiod=14)
-        # EMA - Exponential Moving Average
-        dataframe['ema5'] = ta.EMA(dataframe['close'], timeperiod=5)
-        dataframe['ema21'] = ta.EMA(dataframe['close'], timeperiod=21)
-        # ATR - Average True Range
-        dataframe['atr'] = ta.ATR(dataframe['high'], dataframe['low'], dataframe['close'], timeperiod=14)
-        # TRIX
-        dataframe['trix'] = ta.TRIX(dataframe['close'], timeperiod=21)
+        dataframe = IndicatorGraph(self.indicators).evaluate(dataframe)
 
         self.recognize_candlestick(dataframe)
         print('\n')
@@ -0,0 +1,136 @@
+# Incremental candle download into the OhlcvStore
+#
+# For every pair the last stored candle is looked up and only the candles after it are
+# requested, page by page, from a ccxt style exchange: fetch_ohlcv(symbol, timeframe,
+# since, limit) returning [[time in ms, open, high, low, close, volume], ...]. Every page
+# is appended as soon as it arrives, so an interrupted sync continues where it stopped.
+# The candle that is still forming is never stored. Pairs are synced concurrently, the
+# work is waiting on the exchange, so threads are enough.
+#
+# LocalExchange serves candles from dataframes with the same interface, to run a sync
+# without network access.
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from pandas import DataFrame
+
+from arima_pool import pool_size
+from ohlcv_store import FIELDS, OhlcvStore, to_milliseconds
+from timeframes import timeframe_to_minutes
+
+
+def sync_pair(store: OhlcvStore, exchange, pair: str, timeframe: str, since=None, until=None,
+              limit: int = 1000) -> int:
+    """
+    :param store: where the candles are kept
+    :type store: OhlcvStore
+    :param exchange: anything with a ccxt style fetch_ohlcv, e.g. ccxt.binance()
+    :param pair: e.g. "ETH/USDT"
+    :type pair: str
+    :param timeframe: e.g. "5m"
+    :type timeframe: str
+    :param since: first candle to download when nothing is stored yet, e.g. config["backtesting-from"]
+    :param until: candle time to stop before, None for the last closed candle
+    :param limit: candles per request
+    :type limit: int
+    :return: number of appended candles
+    :rtype: int
+    """
+    candle = timeframe_to_minutes(timeframe) * 60 * 1000
+    # only candles that have closed, the current one still changes
+    closed = (int(time.time() * 1000) // candle - 1) * candle
+    stop = closed + 1 if until is None else min(to_milliseconds(until), closed + 1)
+
+    last = store.last_timestamp(pair, timeframe)
+    start = last + candle if last is not None else (to_milliseconds(since) if since is not None else None)
+
+    appended = 0
+    while start is None or start < stop:
+        rows = exchange.fetch_ohlcv(pair, timeframe, since=start, limit=limit)
+        if not rows:
+            break
+        page = np.asarray(rows, dtype=np.float64).reshape(-1, 6)
+        times = page[:, 0].astype(np.int64)
+        keep = times < stop
+        if start is not None:
+            keep &= times >= start
+        if keep.any():
+            appended += store.append(pair, timeframe, _page_frame(times[keep], page[keep]))
+        # no newer candles in this page, or the exchange has nothing past it
+        if times[-1] + candle >= stop or (start is not None and times[-1] < start):
+            break
+        start = int(times[-1]) + candle
+    return appended
+
+
+def sync_pairs(store: OhlcvStore, exchange, pairs: list, timeframe: str, since=None, until=None,
+               limit: int = 1000, max_workers: int = None) -> dict:
+    """
+    :param pairs: e.g. config["pairs"]
+    :type pairs: list
+    :param max_workers: upper bound for the number of concurrent downloads
+    :type max_workers: int
+    :return: number of appended candles per pair
+    :rtype: dict
+    """
+    if not pairs:
+        return {}
+    with ThreadPoolExecutor(pool_size(len(pairs), max_workers or 8)) as pool:
+        futures = {pair: pool.submit(sync_pair, store, exchange, pair, timeframe, since, until, limit)
+                   for pair in pairs}
+        return {pair: future.result() for pair, future in futures.items()}
+
+
+def sync_config(store: OhlcvStore, exchange, config: dict, max_workers: int = None) -> dict:
+    """
+    Brings the store up to date for a backtest, up to now with "backtesting-till-now".
+
+    :param config: contents of config.json
+    :type config: dict
+    :return: number of appended candles per pair
+    :rtype: dict
+    """
+    until = None if config.get('backtesting-till-now') else config.get('backtesting-to')
+    return sync_pairs(store, exchange, config['pairs'], config['timeframe'], config.get('backtesting-from'),
+                      until, max_workers=max_workers)
+
+
+class LocalExchange:
+    """
+    Stand-in for a ccxt exchange that serves candles from dataframes.
+    """
+
+    def __init__(self, candles: dict, timeframe: str = '5m', limit: int = 1000):
+        """
+        :param candles: OHLCV data per pair with a DatetimeIndex, e.g. {"ETH/USDT": DataFrame}
+        :type candles: dict
+        :param timeframe: timeframe of the dataframes
+        :type timeframe: str
+        :param limit: most candles returned per request, like the exchange's own limit
+        :type limit: int
+        """
+        self.timeframe = timeframe
+        self.limit = limit
+        self.requests = 0
+        self._candles = {}
+        for pair, dataframe in candles.items():
+            times = np.asarray(dataframe.index.values, dtype='datetime64[ms]').view(np.int64)
+            values = dataframe[list(FIELDS)].to_numpy(dtype=np.float64)
+            self._candles[pair] = (times, values)
+
+    def fetch_ohlcv(self, symbol: str, timeframe: str = '1m', since: int = None, limit: int = None) -> list:
+        if timeframe != self.timeframe:
+            raise ValueError(f"LocalExchange only has {self.timeframe} candles, got {timeframe}")
+        self.requests += 1
+        times, values = self._candles[symbol]
+        begin = 0 if since is None else int(np.searchsorted(times, since, side='left'))
+        end = begin + min(limit or self.limit, self.limit)
+        return [[int(moment)] + row for moment, row in zip(times[begin:end], values[begin:end].tolist())]
+
+
+def _page_frame(times: np.ndarray, page: np.ndarray) -> DataFrame:
+    frame = DataFrame(page[:, 1:], columns=list(FIELDS))
+    frame.insert(0, 'time', times)
+    return frame
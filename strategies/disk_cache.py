@@ -0,0 +1,135 @@
+# Small pickle based key/value store used to keep expensive results between runs
+
+import hashlib
+import os
+import pickle
+import tempfile
+
+import numpy as np
+
+
+def make_key(*parts) -> str:
+    """
+    :param parts: anything with a stable repr, e.g. strings, numbers and tuples
+    :return: hex digest identifying the parts
+    :rtype: str
+    """
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+def array_fingerprint(*arrays) -> str:
+    """
+    :param arrays: numpy arrays or pandas Series
+    :return: hex digest of the dtype, shape and raw bytes of all arrays
+    :rtype: str
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        digest.update(repr((array.dtype.str, array.shape)).encode())
+        digest.update(memoryview(array).cast('B'))
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """
+    Stores one pickle file per key in a directory.
+    Reading an entry marks it as recently used. Once there are more than max_entries, the
+    least recently used entries are evicted in one batch down to (1 - evict_fraction) *
+    max_entries. The number of entries is counted in memory between evictions, so the
+    directory is only listed when the count says it is full.
+    """
+
+    suffix = '.pkl'
+    # share of max_entries removed per eviction
+    evict_fraction = 0.1
+
+    def __init__(self, directory: str, max_entries: int = 256):
+        self.directory = directory
+        self.max_entries = max_entries
+        # entries in the directory as far as this process knows, listed on first use
+        self._count = None
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get(self, key: str, default=None):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                value = pickle.load(file)
+        except FileNotFoundError:
+            return default
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # written by an incompatible version, drop it
+            self.invalidate(key)
+            return default
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # evicted by another process since it was read, the value is still good
+            pass
+        return value
+
+    def set(self, key: str, value):
+        os.makedirs(self.directory, exist_ok=True)
+        added = not os.path.exists(self._path(key))
+        # write to a temporary file first, so readers never see half written entries
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        if added:
+            self._added()
+
+    def invalidate(self, key: str = None):
+        """
+        :param key: entry to remove, all entries are removed if None
+        :type key: str
+        """
+        paths = [self._path(key)] if key is not None else self._entries()
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            if self._count:
+                self._count -= 1
+
+    def _entries(self) -> list:
+        if not os.path.isdir(self.directory):
+            return []
+        return [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                if name.endswith(self.suffix)]
+
+    def _added(self):
+        if self._count is None:
+            self._count = len(self._entries())
+        else:
+            self._count += 1
+        if self._count > self.max_entries:
+            self._evict()
+
+    def _evict(self):
+        # other processes may write and evict in the same directory, the listing is the truth
+        entries = []
+        for path in self._entries():
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                pass
+        self._count = len(entries)
+        if len(entries) <= self.max_entries:
+            return
+        keep = int(self.max_entries * (1 - self.evict_fraction))
+        entries.sort()
+        for _, path in entries[:len(entries) - keep]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self._count = keep
@@ -1,7 +1,9 @@
 # Mandatory Imports
 # Optional Imports
-import talib.abstract as ta
 from pandas import DataFrame
+from indicator_graph import COMMON_INDICATORS, IndicatorGraph, IndicatorNode
+from indicator_kernels import bollinger_bands
+from signal_expressions import SignalExpression
 
 from backtesting.strategy import Strategy
 
@@ -11,6 +13,31 @@ class DoubleBBandsStrategy(Strategy):
     This is an example custom strategy, that inherits from the main Strategy class
     """
 
+    indicators = COMMON_INDICATORS + [
+        # outer and inner band from one moving average and standard deviation
+        IndicatorNode(('bband_up', 'bband_mid', 'bband_low', 'inner_bband_up', 'inner_bband_mid', 'inner_bband_low'),
+                      bollinger_bands, ('close',),
+                      timeperiod=21,
+                      # number of non-biased standard deviations from the mean, (nbdevup, nbdevdn) per band
+                      deviations=((2.0, 2.0), (1.0, 1.0)),
+                      # Moving average type: simple moving average here
+                      matype=2),
+    ]
+
+    buy_conditions = SignalExpression("""
+        (rsi < 30) &
+        (volume > 0) &
+        (close > bband_low) &
+        (close < inner_bband_low)
+    """)
+
+    sell_conditions = SignalExpression("""
+        (rsi > 70) &
+        (volume > 0) &
+        (close > bband_low) &
+        (close < inner_bband_low)
+    """)
+
     def generate_indicators(self, dataframe: DataFrame) -> DataFrame:
         """
         :param dataframe: All passed candles (current candle included!) with OHLCV data
@@ -18,30 +45,7 @@ class DoubleBBandsStrategy(Strategy):
         :return: Dataframe filled with indicator-data
         :rtype: DataFrame
         """
-        # RSI - Relative Strength Index
-        dataframe['rsi'] = ta.RSI(dataframe, timeperiod=14)
-        # ATR - Average True Range
-        dataframe['atr'] = ta.ATR(dataframe['high'], dataframe['low'], dataframe['close'], timeperiod=14)
-        # EMA - Exponential Moving Average
-        dataframe['ema5'] = ta.EMA(dataframe, timeperiod=5)
-        dataframe['ema21'] = ta.EMA(dataframe, timeperiod=21)
-
-        dataframe['bband_up'], dataframe['bband_mid'], dataframe['bband_low'] = ta.BBANDS(dataframe['close'].values,
-                                                                                          timeperiod=21,
-                                                                                          # number of non-biased standard deviations from the mean
-                                                                                          nbdevup=2.0,
-                                                                                          nbdevdn=2.0,
-                                                                                          # Moving average type: simple moving average here
-                                                                                          matype=2)
-
-        dataframe['inner_bband_up'], dataframe['inner_bband_mid'], dataframe['inner_bband_low'] = ta.BBANDS(dataframe['close'].values,
-                                                                                          timeperiod=21,
-                                                                                          # number of non-biased standard deviations from the mean
-                                                                                          nbdevup=1.0,
-                                                                                          nbdevdn=1.0,
-                                                                                          # Moving average type: simple moving average here
-                                                                                          matype=2)
-        return dataframe
+        return IndicatorGraph(self.indicators).evaluate(dataframe)
 
     def buy_signal(self, dataframe: DataFrame) -> DataFrame:
         """
@@ -52,14 +56,7 @@ class DoubleBBandsStrategy(Strategy):
         """
         # BEGIN STRATEGY
 
-        dataframe.loc[
-            (
-                (dataframe['rsi'] < 30) &
-                (dataframe['volume'] > 0) &
-                (dataframe['close'] > dataframe['bband_low']) &
-                (dataframe['close'] < dataframe['inner_bband_low'])
-            ),
-            'buy'] = 1
+        dataframe['buy'] = self.buy_conditions.evaluate(dataframe)
 
         # END STRATEGY
 
@@ -74,16 +71,7 @@ class DoubleBBandsStrategy(Strategy):
         """
         # BEGIN STRATEGY
 
-        dataframe.loc[
-            (
-                (dataframe['rsi'] > 70) &
-                (dataframe['volume'] > 0) &
-                (dataframe['close'] > dataframe['bband_low']) &
-                (dataframe['close'] < dataframe['inner_bband_low'])
-
-
-            ),
-            'sell'] = 1
+        dataframe['sell'] = self.sell_conditions.evaluate(dataframe)
 
         # END STRATEGY
 
@@ -0,0 +1,266 @@
+# Exit rule sweeps on fixed signals
+#
+# "stoploss", "stoploss-type", "roi" and "fee" do not change any indicator, buy or sell
+# signal or the dynamic stoploss column. Those are computed once per pair, after that an
+# exit configuration only costs a trade simulation.
+#
+# Same rules as trade_simulator.simulate_trades, organised for many configurations: the
+# exit of a trade only depends on its entry candle, so the exits of all buy candles are
+# found at once with array scans over windows of the following candles. Which of those
+# entries are taken, one trade at a time per pair and at most "max-open-trades" in total,
+# is then a walk over plain integers, see portfolio.
+# The fee does not change the trades, only their profit, so configurations that only
+# differ in the fee share one simulation.
+
+import json
+
+import numpy as np
+
+from portfolio import allocate, portfolio_summary
+from roi_table import RoiTable
+from trade_simulator import (EXIT_END_OF_DATA, EXIT_ROI, EXIT_SELL_SIGNAL, EXIT_STOPLOSS, next_true,
+                             signal_mask, simulation_settings, trades_frame)
+
+_REASONS = np.array([EXIT_SELL_SIGNAL, EXIT_STOPLOSS, EXIT_ROI, EXIT_END_OF_DATA], dtype=object)
+_SELL, _STOPLOSS, _ROI, _END_OF_DATA = range(4)
+
+# candles after the entry compared per pass, doubled every pass for the trades still open
+_FIRST_WINDOW = 64
+_MAX_WINDOW = 4096
+# upper bound for trades x window per scan, keeps the temporary arrays at a few 10 MB
+_MAX_ELEMENTS = 1 << 20
+
+
+class PairSignals:
+    """
+    Candles, signals and the dynamic stoploss column of one pair, as arrays.
+    """
+
+    def __init__(self, dataframe):
+        """
+        :param dataframe: output of the strategy's generate_indicators, buy_signal, sell_signal and stoploss
+        :type dataframe: DataFrame
+        """
+        self.dataframe = dataframe
+        self.open = dataframe['open'].to_numpy(dtype=float)
+        self.high = dataframe['high'].to_numpy(dtype=float)
+        self.low = dataframe['low'].to_numpy(dtype=float)
+        self.close = dataframe['close'].to_numpy(dtype=float)
+        self.sell = signal_mask(dataframe, 'sell')
+        self.times = np.asarray(dataframe.index.values, dtype='datetime64[ns]').view(np.int64)
+        self.candidates = np.flatnonzero(signal_mask(dataframe, 'buy'))
+
+        length = len(dataframe)
+        self.stop = np.full(length, np.nan)
+        if 'stoploss' in dataframe and length:
+            self.stop[1:] = dataframe['stoploss'].to_numpy(dtype=float)[:-1]
+        self._bounds = {}
+
+    def bounds(self, dynamic: bool) -> tuple:
+        """
+        :return: per buy candle the first sell signal or dynamic stoploss hit after it, and the
+                 stoploss hits per candle
+        :rtype: tuple
+        """
+        if dynamic not in self._bounds:
+            length = len(self.close)
+            stop_hit = self.low <= self.stop if dynamic else np.zeros(length, dtype=bool)
+            next_exit = np.append(next_true(self.sell | stop_hit), length)
+            self._bounds[dynamic] = next_exit[self.candidates + 1], stop_hit
+        return self._bounds[dynamic]
+
+    def exits(self, stoploss_type: str = 'dynamic', stoploss: float = None, roi=None,
+              timeframe: str = '5m') -> tuple:
+        """
+        :return: exit candle, exit price and exit reason code of the trade of every buy candle, fees excluded
+        :rtype: tuple
+        """
+        length = len(self.close)
+        candidates = self.candidates
+        dynamic = stoploss_type == 'dynamic'
+        bound, stop_hit = self.bounds(dynamic)
+        end = np.minimum(bound + 1, length)
+        entry_close = self.close[candidates]
+
+        exit_index = bound.copy()
+        reason = np.full(len(candidates), -1)
+        price = np.full(len(candidates), np.nan)
+
+        stopped = np.zeros(len(candidates), dtype=bool)
+        if stoploss is not None and not dynamic:
+            level = entry_close * (1 + stoploss / 100)
+            hit = _first_hit(self.low, candidates, end, level[:, np.newaxis], below=True)
+            stopped = hit < end
+            exit_index[stopped] = hit[stopped]
+            reason[stopped] = _STOPLOSS
+            price[stopped] = np.minimum(self.open[hit[stopped]], level[stopped])
+
+        if roi is not None:
+            if not isinstance(roi, RoiTable):
+                roi = RoiTable(roi)
+            factors = 1 + roi.per_candle(timeframe) / 100
+            targets = entry_close[:, np.newaxis] * factors
+            hit = _first_hit(self.high, candidates, end, targets, below=False)
+            found = hit < end
+            # a stoploss on the same candle goes first
+            same_candle_stop = stop_hit[np.minimum(hit, length - 1)]
+            taken = found & np.where(stopped, hit < exit_index,
+                                     (hit < bound) | ((hit == bound) & ~same_candle_stop))
+            exit_index[taken] = hit[taken]
+            reason[taken] = _ROI
+            offset = np.minimum(hit[taken] - candidates[taken], len(factors) - 1)
+            price[taken] = np.maximum(self.open[hit[taken]], targets[np.flatnonzero(taken), offset])
+
+        # the trade independent exit
+        rest = reason < 0
+        at_end = rest & (bound >= length)
+        exit_index[at_end] = length - 1
+        reason[at_end] = _END_OF_DATA
+        price[at_end] = self.close[-1] if length else np.nan
+        rest &= ~at_end
+        stop_exit = rest & stop_hit[np.minimum(bound, length - 1)]
+        reason[stop_exit] = _STOPLOSS
+        price[stop_exit] = np.minimum(self.open[bound[stop_exit]], self.stop[bound[stop_exit]])
+        rest &= ~stop_exit
+        reason[rest] = _SELL
+        price[rest] = self.close[bound[rest]]
+        return exit_index, price, reason
+
+    def simulate(self, stoploss_type: str = 'dynamic', stoploss: float = None, roi=None,
+                 timeframe: str = '5m') -> tuple:
+        """
+        :return: entry candle, exit candle, exit price and exit reason code per trade, fees excluded
+        :rtype: tuple
+        """
+        candidates = self.candidates
+        exit_index, price, reason = self.exits(stoploss_type, stoploss, roi, timeframe)
+
+        # one trade at a time: the next entry is the first buy candle after the exit
+        following = np.searchsorted(candidates, exit_index, side='right').tolist()
+        trades, position = [], 0
+        while position < len(following):
+            trades.append(position)
+            position = following[position]
+
+        trades = np.array(trades, dtype=np.int64)
+        return candidates[trades], exit_index[trades], price[trades], reason[trades]
+
+    def trades(self, stoploss_type: str = 'dynamic', stoploss: float = None, roi=None, timeframe: str = '5m',
+               fee: float = 0):
+        """
+        :return: the trades as returned by simulate_trades with the same settings
+        :rtype: DataFrame
+        """
+        entries, exits, prices, reasons = self.simulate(stoploss_type, stoploss, roi, timeframe)
+        return trades_frame(self.dataframe, entries, exits, prices, list(_REASONS[reasons]), fee)
+
+    def candidate_trades(self, stoploss_type: str = 'dynamic', stoploss: float = None, roi=None,
+                         timeframe: str = '5m', fee: float = 0):
+        """
+        :return: the trade of every buy candle, as if the pair had no open trade at its close
+        :rtype: DataFrame
+        """
+        exits, prices, reasons = self.exits(stoploss_type, stoploss, roi, timeframe)
+        return trades_frame(self.dataframe, self.candidates, exits, prices, list(_REASONS[reasons]), fee)
+
+
+def prepare_signals(strategy, dataframes: dict) -> dict:
+    """
+    :param strategy: strategy instance
+    :param dataframes: OHLCV data per pair, e.g. {"ETH/USDT": DataFrame}
+    :type dataframes: dict
+    :return: signals and dynamic stoploss column per pair
+    :rtype: dict
+    """
+    # stages over all pairs at once, e.g. the parallel ARIMA fits of the ARIMA strategies
+    prepare_pairs = getattr(strategy, 'prepare_pairs', None)
+    if prepare_pairs is not None:
+        dataframes = prepare_pairs(dict(dataframes))
+
+    signals = {}
+    for pair, dataframe in dataframes.items():
+        dataframe = strategy.generate_indicators(dataframe)
+        dataframe = strategy.buy_signal(dataframe)
+        dataframe = strategy.sell_signal(dataframe)
+        dataframe = strategy.stoploss(dataframe)
+        signals[pair] = PairSignals(dataframe)
+    return signals
+
+
+def sweep_exits(signals: dict, config: dict, variants):
+    """
+    :param signals: from prepare_signals
+    :type signals: dict
+    :param config: contents of config.json, the variants are applied on top of it
+    :type config: dict
+    :param variants: config overrides, e.g. parameter_sweep.grid({"stoploss": [-2, -4], "fee": [0.1, 0.25]})
+    :return: per variant the portfolio outcome after "max-open-trades", in the order of variants
+    :rtype: generator
+    """
+    simulated = {}
+    for variant in variants:
+        settings = simulation_settings({**config, **variant})
+        fee = settings.pop('fee') / 100
+        key = json.dumps(settings, sort_keys=True, default=str)
+        if key not in simulated:
+            # only the last exit rules are kept, grids vary the fee fastest when it comes last
+            simulated = {key: _portfolio_trades(signals, settings)}
+        entry_times, exit_times, entry_prices, exit_prices, pairs = simulated[key]
+
+        ratios = exit_prices * (1 - fee) / (entry_prices * (1 + fee)) - 1
+        taken, stakes, _ = allocate(entry_times, exit_times, ratios,
+                                    config['max-open-trades'], config['starting-capital'], pairs)
+        yield {'exits': variant, **portfolio_summary(stakes * ratios[taken], config['starting-capital'])}
+
+
+def _portfolio_trades(signals, settings):
+    """
+    :return: entry time, exit time, entry price, exit price and pair code of the trade of every buy
+             candle of all pairs, in entry order
+    """
+    columns = [[], [], [], [], []]
+    for code, pair_signals in enumerate(signals.values()):
+        entries = pair_signals.candidates
+        exits, prices, _ = pair_signals.exits(**settings)
+        for column, values in zip(columns, (pair_signals.times[entries], pair_signals.times[exits],
+                                            pair_signals.close[entries], prices,
+                                            np.full(len(entries), code))):
+            column.append(values)
+    columns = [np.concatenate(column) if column else np.empty(0) for column in columns]
+    order = np.argsort(columns[0], kind='stable')
+    return tuple(column[order] for column in columns)
+
+
+def _first_hit(values, entries, ends, targets, below: bool) -> np.ndarray:
+    """
+    :param values: e.g. the low prices
+    :param entries: entry candle per trade
+    :param ends: candle to stop before per trade
+    :param targets: level per trade and candle since entry, the last column holds from then on
+    :param below: look for values at or below the target instead of at or above
+    :return: per trade the first candle after the entry that reaches its target, ends where there is none
+    """
+    result = ends.copy()
+    start = entries + 1
+    todo = np.flatnonzero(start < ends)
+    window = _FIRST_WINDOW
+    last_value, last_target = len(values) - 1, targets.shape[1] - 1
+    while len(todo):
+        found = np.zeros(len(todo), dtype=bool)
+        step = max(1, _MAX_ELEMENTS // window)
+        for first in range(0, len(todo), step):
+            trades = todo[first:first + step]
+            candles = start[trades, np.newaxis] + np.arange(window)
+            inside = candles < ends[trades, np.newaxis]
+            offsets = np.minimum(candles - entries[trades, np.newaxis], last_target)
+            levels = targets[trades[:, np.newaxis], offsets]
+            observed = values[np.minimum(candles, last_value)]
+            hits = (observed <= levels if below else observed >= levels) & inside
+
+            hit = hits.any(axis=1)
+            result[trades[hit]] = candles[hit, hits[hit].argmax(axis=1)]
+            found[first:first + step] = hit
+        start[todo] += window
+        todo = todo[~found & (start[todo] < ends[todo])]
+        window = min(2 * window, _MAX_WINDOW)
+    return result
@@ -2,80 +2,109 @@
 import pandas as pd
 
 # Optional Imports
-import talib.abstract as ta
+from collections import deque
+
+import numpy as np
+from indicator_cache import cached_indicator
+from signal_expressions import SignalExpression
 
 from backtesting.strategy import Strategy
 
 
+def rolling_extremes(values, lookback):
+    """
+    Rolling max and min with monotonic deques, amortized O(1) per value. NaN values are
+    skipped like pandas' rolling max and min do, a window of only NaN gives NaN.
+
+    :param values: values, oldest first
+    :type values: ndarray
+    :param lookback: window length, the first windows are shorter
+    :type lookback: int
+    :return: rolling max and rolling min
+    :rtype: tuple
+    """
+    values = np.asarray(values, dtype=float)
+    maximum = np.empty(len(values))
+    minimum = np.empty(len(values))
+    # indices of candidates, their values are decreasing (max) or increasing (min)
+    max_queue, min_queue = deque(), deque()
+
+    for index, value in enumerate(values.tolist()):
+        if value == value:
+            while max_queue and values[max_queue[-1]] <= value:
+                max_queue.pop()
+            max_queue.append(index)
+            while min_queue and values[min_queue[-1]] >= value:
+                min_queue.pop()
+            min_queue.append(index)
+
+        if max_queue and max_queue[0] <= index - lookback:
+            max_queue.popleft()
+        if min_queue and min_queue[0] <= index - lookback:
+            min_queue.popleft()
+
+        maximum[index] = values[max_queue[0]] if max_queue else np.nan
+        minimum[index] = values[min_queue[0]] if min_queue else np.nan
+
+    return maximum, minimum
+
+
 class FibonacciRetracementsStrategy(Strategy):
     """
     This is an example custom strategy for advanced users, that inherits from the main Strategy class
     """
 
+    buy_conditions = SignalExpression("""
+        (rsi < 30) &
+        (volume > 0) &
+        ((close >= prev(upper_lvl)) | (close <= prev(lower_lvl))) &
+        (MACD < MACDsignal)
+    """)
+
+    sell_conditions = SignalExpression("""
+        (rsi > 70) &
+        (ema5 < ema21) &
+        (volume > 0) &
+        ((close >= prev(upper_lvl)) | (close <= prev(lower_lvl))) &
+        (MACD > MACDsignal)
+    """)
+
+    # retracement ratios of the 1st to 4th level, measured down from the maximum
+    fibonacci_ratios = np.array([0.236, 0.382, 0.5, 0.618])
+    # candles the max and min close are taken over, None uses the whole frame
+    fibonacci_lookback = None
+
     def setFibonacciLevels(self, dataframe: pd.DataFrame) -> pd.DataFrame:
 
-        # Calculate the max and min close price
-        maximum_price = dataframe['close'].max()
-        minimum_price = dataframe['close'].min()
+        close = dataframe['close'].to_numpy(dtype=float)
+        ratios = self.fibonacci_ratios
+
+        # Calculate the max and min close price, NaN closes are skipped
+        if self.fibonacci_lookback is None:
+            has_prices = not np.isnan(close).all()
+            maximum_price = np.full(len(close), np.nanmax(close) if has_prices else np.nan)
+            minimum_price = np.full(len(close), np.nanmin(close) if has_prices else np.nan)
+        else:
+            maximum_price, minimum_price = rolling_extremes(close, self.fibonacci_lookback)
         difference = maximum_price - minimum_price  # Get the difference
 
-        first_level = maximum_price - difference * 0.236
-        second_level = maximum_price - difference * 0.382
-        third_level = maximum_price - difference * 0.5
-        fourth_level = maximum_price - difference * 0.618
-
-        dataframe['upper_lvl'], dataframe['lower_lvl'] = (fourth_level, minimum_price)
-
-        # 1st level
-        dataframe.loc[
-            (
-                (dataframe['close'] >= first_level)
-            ),
-            'upper_lvl'] = maximum_price
-        dataframe.loc[
-            (
-                (dataframe['close'] >= first_level)
-            ),
-            'lower_lvl'] = first_level
-        # 2nd level
-        dataframe.loc[
-            (
-                (dataframe['close'] >= second_level) &
-                (dataframe['close'] <= first_level)
-            ),
-            'upper_lvl'] = first_level
-        dataframe.loc[
-            (
-                (dataframe['close'] >= second_level) &
-                (dataframe['close'] <= first_level)
-            ),
-            'lower_lvl'] = second_level
-        # 3rd level
-        dataframe.loc[
-            (
-                (dataframe['close'] >= third_level) &
-                (dataframe['close'] <= second_level)
-            ),
-            'upper_lvl'] = second_level
-        dataframe.loc[
-            (
-                (dataframe['close'] >= third_level) &
-                (dataframe['close'] <= second_level)
-            ),
-            'lower_lvl'] = third_level
-        # 4th level
-        dataframe.loc[
-            (
-                (dataframe['close'] >= fourth_level) &
-                (dataframe['close'] <= third_level)
-            ),
-            'upper_lvl'] = third_level
-        dataframe.loc[
-            (
-                (dataframe['close'] >= fourth_level) &
-                (dataframe['close'] <= third_level)
-            ),
-            'lower_lvl'] = fourth_level
+        # every level per candle, from the top down: max, 1st to 4th level, min
+        levels = np.column_stack([maximum_price] +
+                                 [maximum_price - difference * ratio for ratio in ratios] +
+                                 [minimum_price])
+
+        # one search over the ratios finds the band every close is in
+        with np.errstate(divide='ignore', invalid='ignore'):
+            retracement = (maximum_price - close) / difference
+        band = np.searchsorted(ratios, retracement, side='right')
+        # a close right on a level belongs to the band below it, except for the 4th level
+        # which closes the band above. Decided on the prices, the ratios may be rounded
+        for level, tie_band in zip(range(1, 5), (1, 2, 3, 3)):
+            band[close == levels[:, level]] = tie_band
+
+        candles = np.arange(len(close))
+        dataframe['upper_lvl'] = levels[candles, band]
+        dataframe['lower_lvl'] = levels[candles, band + 1]
 
         return dataframe
 
@@ -88,17 +117,17 @@ class FibonacciRetracementsStrategy(Strategy):
 
         """
         # RSI - Relative Strength Index
-        dataframe['rsi'] = ta.RSI(dataframe, timeperiod=14)
+        dataframe['rsi'] = cached_indicator('RSI', dataframe, timeperiod=14)
         # ATR - Average True Range
-        dataframe['atr'] = ta.ATR(dataframe['high'], dataframe['low'], dataframe['close'], timeperiod=14)
+        dataframe['atr'] = cached_indicator('ATR', dataframe, timeperiod=14)
         # EMA - Exponential Moving Average
-        dataframe['ema5'] = ta.EMA(dataframe, timeperiod=5)
-        dataframe['ema21'] = ta.EMA(dataframe, timeperiod=21)
+        dataframe['ema5'] = cached_indicator('EMA', dataframe, timeperiod=5)
+        dataframe['ema21'] = cached_indicator('EMA', dataframe, timeperiod=21)
         # MACD
-        dataframe['MACD'], dataframe['MACDsignal'], dataframe['MACDhist'] = ta.MACD(dataframe.close,
-                                                                                    fastperiod=12,
-                                                                                    slowperiod=26,
-                                                                                    signalperiod=9)
+        macd = cached_indicator('MACD', dataframe, fastperiod=12, slowperiod=26, signalperiod=9)
+        dataframe['MACD'] = macd['macd']
+        dataframe['MACDsignal'] = macd['macdsignal']
+        dataframe['MACDhist'] = macd['macdhist']
 
 
         self.setFibonacciLevels(dataframe)
@@ -113,14 +142,7 @@ class FibonacciRetracementsStrategy(Strategy):
         :rtype: DataFrame
         """
         # BEGIN STRATEGY
-        dataframe.loc[
-            (
-                (dataframe['rsi'] < 30) &
-                (dataframe['volume'] > 0) &
-                ((dataframe['close'] >= dataframe.shift(1)['upper_lvl']) | (dataframe['close'] <= dataframe.shift(1)['lower_lvl'])) &
-                (dataframe['MACD'] < dataframe['MACDsignal'])
-            ),
-            'buy'] = 1
+        dataframe['buy'] = self.buy_conditions.evaluate(dataframe)
 
         # END STRATEGY
 
@@ -134,15 +156,7 @@ class FibonacciRetracementsStrategy(Strategy):
         :rtype: DataFrame
         """
         # BEGIN STRATEGY
-        dataframe.loc[
-            (
-                (dataframe['rsi'] > 70) &
-                (dataframe['ema5'] < dataframe['ema21']) &
-                (dataframe['volume'] > 0) &
-                ((dataframe['close'] >= dataframe.shift(1)['upper_lvl']) | (dataframe['close'] <= dataframe.shift(1)['lower_lvl'])) &
-                (dataframe['MACD'] > dataframe['MACDsignal'])
-            ),
-            'sell'] = 1
+        dataframe['sell'] = self.sell_conditions.evaluate(dataframe)
 
         # END STRATEGY
 
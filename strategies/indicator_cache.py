@@ -0,0 +1,179 @@
+# Memoized TA-Lib indicators
+#
+# Most strategies compute the same indicators (RSI 14, EMA 5 and 21, ATR 14) on the same
+# candles. Results are keyed by pair, timeframe, a fingerprint of the input columns, the
+# indicator name and its parameters, and kept in two tiers: an in-memory LRU shared by
+# all strategies in the process and a DiskCache in the mounted data volume, so repeated
+# and multi strategy runs skip TA-Lib. Runs that compute many throwaway variants, e.g.
+# parameter sweeps, switch the disk tier off with persist=False or memory_only().
+#
+# The OHLCV columns are treated as read-only: the fingerprint of a column is computed
+# once per frame and reused for as long as the column keeps the same buffer.
+
+import threading
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import talib
+import talib.abstract as ta_abstract
+from pandas import DataFrame, Series
+
+from disk_cache import DiskCache, array_fingerprint, make_key
+
+
+class IndicatorCache:
+    """
+    In-memory LRU in front of an optional DiskCache.
+    Values are tuples of numpy arrays, one per indicator output.
+    """
+
+    def __init__(self, max_entries: int = 128, disk: DiskCache = None, persist: bool = True):
+        """
+        :param max_entries: entries kept in memory
+        :type max_entries: int
+        :param disk: second tier, None for memory only
+        :type disk: DiskCache
+        :param persist: read and write the disk tier, False keeps it untouched
+        :type persist: bool
+        """
+        self.max_entries = max_entries
+        self.disk = disk
+        self.persist = persist
+        self._entries = OrderedDict()
+        self._fingerprints = {}
+        # indicators may be computed from several threads, see indicator_graph
+        self._lock = threading.RLock()
+
+    def get(self, key: str):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        if self.disk is None or not self.persist:
+            return None
+        value = self.disk.get(key)
+        if value is not None:
+            self._remember(key, value)
+        return value
+
+    def set(self, key: str, value, persist: bool = True):
+        """
+        :param persist: also write the value to the disk tier, unless the cache does not persist
+        :type persist: bool
+        """
+        self._remember(key, value)
+        if persist and self.persist and self.disk is not None:
+            self.disk.set(key, value)
+
+    @contextmanager
+    def memory_only(self):
+        """
+        Keeps the disk tier untouched inside the with block, e.g.
+            with INDICATOR_CACHE.memory_only():
+                evaluate_combination(...)
+        """
+        persist, self.persist = self.persist, False
+        try:
+            yield self
+        finally:
+            self.persist = persist
+
+    def invalidate(self, key: str = None):
+        """
+        :param key: entry to remove from both tiers, all entries are removed if None
+        :type key: str
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+        if self.disk is not None:
+            self.disk.invalidate(key)
+
+    def fingerprint(self, dataframe: DataFrame, column: str) -> str:
+        """
+        :param dataframe: frame holding the column
+        :type dataframe: DataFrame
+        :param column: e.g. "close"
+        :type column: str
+        :return: fingerprint of the column values, memoized per frame
+        :rtype: str
+        """
+        values = dataframe[column].to_numpy()
+        buffer = (values.__array_interface__['data'][0], values.shape, values.dtype.str)
+
+        frame_id = id(dataframe)
+        with self._lock:
+            reference, columns = self._fingerprints.get(frame_id, (None, None))
+            if reference is None or reference() is not dataframe:
+                # forget the frame once it is garbage collected, its id may be reused
+                reference = weakref.ref(dataframe, lambda _: self._fingerprints.pop(frame_id, None))
+                columns = {}
+                self._fingerprints[frame_id] = (reference, columns)
+            known = columns.get(column)
+
+        if known is not None and known[0] == buffer:
+            return known[1]
+        fingerprint = array_fingerprint(values)
+        columns[column] = (buffer, fingerprint)
+        return fingerprint
+
+    def _remember(self, key: str, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+INDICATOR_CACHE = IndicatorCache(disk=DiskCache('data/cache/indicators', max_entries=256))
+
+
+def cached_indicator(name: str, dataframe: DataFrame, pair: str = None, timeframe: str = None,
+                     cache: IndicatorCache = INDICATOR_CACHE, **params):
+    """
+    Drop-in replacement for getattr(talib.abstract, name)(dataframe, **params) that remembers its result,
+    e.g. cached_indicator('RSI', dataframe, timeperiod=14).
+
+    :param name: TA-Lib function name, e.g. "RSI"
+    :type name: str
+    :param dataframe: OHLCV data
+    :type dataframe: DataFrame
+    :param pair: e.g. "ETH/USDT", optional since the data fingerprint already identifies the pair
+    :type pair: str
+    :param timeframe: e.g. "5m"
+    :type timeframe: str
+    :param cache: where results are kept
+    :type cache: IndicatorCache
+    :param params: indicator parameters and input column overrides, e.g. timeperiod=5, price="open"
+    :return: one Series per output, a DataFrame of them for indicators with several outputs
+    :rtype: Series
+    """
+    function = ta_abstract.Function(name)
+    function.set_function_args(**params)
+
+    # e.g. {'prices': ['high', 'low', 'close']} or {'price': 'close'}
+    columns = []
+    for names in function.input_names.values():
+        columns.extend([names] if isinstance(names, str) else names)
+
+    key = make_key('talib', talib.__version__, function.info['name'], pair, timeframe, len(dataframe),
+                   [(column, cache.fingerprint(dataframe, column)) for column in columns],
+                   list(function.parameters.items()))
+    outputs = cache.get(key)
+    if outputs is None:
+        function.set_input_arrays(dataframe)
+        results = function.outputs
+        if isinstance(results, DataFrame):
+            outputs = tuple(results[column].to_numpy() for column in results.columns)
+        elif isinstance(results, Series):
+            outputs = (results.to_numpy(),)
+        else:
+            outputs = tuple(results) if isinstance(results, list) else (results,)
+        cache.set(key, outputs)
+
+    if len(outputs) == 1:
+        return Series(outputs[0], index=dataframe.index, copy=True)
+    return DataFrame(dict(zip(function.output_names, outputs)), index=dataframe.index, copy=True)
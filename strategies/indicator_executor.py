@@ -0,0 +1,82 @@
+# Thread pool for independent indicator calls
+#
+# TA-Lib releases the GIL around its C functions (ta-lib-python 0.6 and later), and nearly
+# all time of an indicator call is spent there. Independent calls for one pair, e.g. the
+# nodes of one IndicatorGraph level or the CDL* pattern functions, therefore run in parallel
+# on threads: no processes to start, nothing to pickle, the columns are shared as they are.
+#
+# One pool is kept for the life of the process instead of starting one per call. A process
+# forked from this one (process pools for pairs, sweeps and ARIMA fits) inherits the pool
+# object but none of its threads, so every executor forgets its pool in the child and
+# starts a new one there when needed.
+
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+# every executor of the process, reset in forked children
+_EXECUTORS = weakref.WeakSet()
+
+
+class IndicatorExecutor:
+    """
+    Lazily started thread pool that maps a function over independent items.
+    """
+
+    def __init__(self, max_workers: int = None):
+        """
+        :param max_workers: number of threads, defaults to the number of CPUs
+        :type max_workers: int
+        """
+        self.max_workers = max(1, max_workers or os.cpu_count() or 1)
+        self._reset()
+        _EXECUTORS.add(self)
+
+    def map(self, function, items) -> list:
+        """
+        :param function: called once per item, e.g. an IndicatorNode's compute
+        :type function: callable
+        :param items: independent inputs
+        :return: results in the order of items
+        :rtype: list
+        """
+        items = list(items)
+        # a single item, a single thread, or a call from inside the pool runs right here
+        if len(items) < 2 or self.max_workers < 2 or getattr(self._local, 'inside', False):
+            return [function(item) for item in items]
+        return list(self._executor().map(function, items))
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix='indicator',
+                                                initializer=self._enter)
+            return self._pool
+
+    def _enter(self):
+        # marks the threads of the pool, nested calls from them must not wait on the pool
+        self._local.inside = True
+
+    def _reset(self):
+        self._pool = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+
+def _reset_after_fork():
+    for executor in list(_EXECUTORS):
+        executor._reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+INDICATOR_EXECUTOR = IndicatorExecutor()
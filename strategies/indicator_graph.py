@@ -0,0 +1,240 @@
+# Declarative indicator graph
+#
+# Strategies declare their indicators as nodes: output columns, a function and its input
+# columns. A graph merges the nodes of any number of strategies, computes each distinct
+# node once and groups them in levels of nodes whose inputs are all available, the nodes
+# of a level run concurrently. Running several strategies on the same pair then costs the
+# union of their indicators instead of the sum.
+#
+# Every output column is stamped in dataframe.attrs with the node that produced it and the
+# fingerprints of its inputs. Nodes whose columns carry a matching stamp are skipped, so the
+# engine can evaluate the merged graph of all strategies per pair before the per strategy
+# flow. Columns without a stamp, or computed from other input values, are computed again.
+
+import numpy as np
+import talib.abstract as ta_abstract
+from pandas import DataFrame
+
+from disk_cache import make_key
+from indicator_cache import INDICATOR_CACHE, IndicatorCache, cached_indicator
+from indicator_executor import INDICATOR_EXECUTOR, IndicatorExecutor
+
+
+class IndicatorNode:
+    """
+    One indicator: function(*input columns, **params) gives one array per output column.
+    A string function is a TA-Lib function name, computed through the indicator cache.
+    Results of callables are kept in the in-memory tier of the cache only, their code may
+    change between runs.
+    """
+
+    def __init__(self, outputs, function, inputs=None, **params):
+        """
+        :param outputs: output column name, or one name per output of the function
+        :type outputs: str or tuple
+        :param function: TA-Lib function name, e.g. "RSI", or a callable taking numpy arrays
+        :type function: str or callable
+        :param inputs: input columns, TA-Lib nodes default to the columns the function reads,
+                       e.g. ("rsi",) computes an EMA of the rsi column
+        :type inputs: tuple
+        :param params: keyword arguments passed to the function, e.g. timeperiod=14
+        :raises ValueError: when the number of inputs or outputs does not match a TA-Lib function
+        """
+        self.outputs = (outputs,) if isinstance(outputs, str) else tuple(outputs)
+        self.function = function
+        self.params = params
+        # keyword arguments of the call, TA-Lib nodes add their input columns
+        self.arguments = params
+        # parameters with the defaults filled in, so RSI() and RSI(timeperiod=14) are the same node
+        self.resolved = params
+
+        if isinstance(function, str):
+            talib_function = ta_abstract.Function(function)
+            talib_function.set_function_args(**params)
+            if inputs is None:
+                inputs = []
+                for names in talib_function.input_names.values():
+                    inputs.extend([names] if isinstance(names, str) else names)
+            self.resolved = dict(talib_function.parameters)
+            self.arguments = {**params, **_talib_inputs(talib_function, inputs)}
+            if len(self.outputs) != len(talib_function.output_names):
+                raise ValueError(f"{function} has {len(talib_function.output_names)} outputs, got {self.outputs}")
+        elif inputs is None:
+            raise ValueError(f"Inputs of {outputs} must be declared")
+        self.inputs = tuple(inputs)
+
+    @property
+    def key(self) -> tuple:
+        """
+        :return: what the node computes, independent of its output column names
+        :rtype: tuple
+        """
+        function = self.function
+        if isinstance(function, str):
+            function = function.upper()
+        else:
+            function = f'{function.__module__}.{function.__qualname__}'
+        return function, self.inputs, tuple(sorted(self.resolved.items()))
+
+    def compute(self, dataframe: DataFrame, cache: IndicatorCache = INDICATOR_CACHE) -> tuple:
+        """
+        :param dataframe: frame holding the input columns
+        :type dataframe: DataFrame
+        :param cache: where results are kept
+        :type cache: IndicatorCache
+        :return: one array per output column
+        :rtype: tuple
+        """
+        if isinstance(self.function, str):
+            result = cached_indicator(self.function, dataframe, cache=cache, **self.arguments)
+            if isinstance(result, DataFrame):
+                return tuple(result[column].to_numpy() for column in result.columns)
+            return result.to_numpy(),
+
+        key = make_key('node', self.key, len(dataframe),
+                       [cache.fingerprint(dataframe, column) for column in self.inputs])
+        outputs = cache.get(key)
+        if outputs is None:
+            result = self.function(*(dataframe[column].to_numpy() for column in self.inputs), **self.params)
+            outputs = tuple(result) if len(self.outputs) > 1 else (result,)
+            cache.set(key, outputs, persist=False)
+        return outputs
+
+    def __repr__(self):
+        return f'IndicatorNode({self.outputs}, {self.key})'
+
+
+def _talib_inputs(function, inputs) -> dict:
+    """
+    :param function: TA-Lib abstract function
+    :param inputs: input columns in the order the function reads its inputs
+    :return: the columns as input arguments of the function, e.g. {"price": "rsi"}
+    :rtype: dict
+    :raises ValueError: when the function reads a different number of inputs
+    """
+    names = function.input_names
+    expected = sum(1 if isinstance(columns, str) else len(columns) for columns in names.values())
+    if len(inputs) != expected:
+        raise ValueError(f"{function.info['name']} reads {expected} input columns, got {tuple(inputs)}")
+    columns = iter(inputs)
+    return {name: next(columns) if isinstance(defaults, str) else [next(columns) for _ in defaults]
+            for name, defaults in names.items()}
+
+
+# dataframe.attrs entry holding the stamp of every column computed by a graph
+STAMPS = 'indicator_stamps'
+
+# indicators most strategies start from
+COMMON_INDICATORS = [
+    # RSI - Relative Strength Index
+    IndicatorNode('rsi', 'RSI', timeperiod=14),
+    # EMA - Exponential Moving Average
+    IndicatorNode('ema5', 'EMA', timeperiod=5),
+    IndicatorNode('ema21', 'EMA', timeperiod=21),
+    # ATR - Average True Range
+    IndicatorNode('atr', 'ATR', timeperiod=14),
+]
+
+
+class IndicatorGraph:
+    """
+    Deduplicated set of indicator nodes. Nodes computing the same thing under different
+    column names are computed once and copied to every name.
+    """
+
+    def __init__(self, nodes=()):
+        # node key -> node computing it, and every set of output columns it is declared with
+        self.nodes = {}
+        self.outputs = {}
+        # column -> key of the node producing it
+        self.producers = {}
+        self.add(*nodes)
+
+    @classmethod
+    def from_strategies(cls, strategies):
+        """
+        :param strategies: strategy instances or classes with an indicators attribute
+        :type strategies: list
+        :return: merged graph of all their indicators
+        :rtype: IndicatorGraph
+        """
+        return cls(node for strategy in strategies for node in getattr(strategy, 'indicators', ()))
+
+    def add(self, *nodes):
+        """
+        :param nodes: nodes to merge into the graph
+        :raises ValueError: when a column is declared by two different computations
+        """
+        for node in nodes:
+            for column in node.outputs:
+                producer = self.producers.get(column)
+                if producer is not None and producer != node.key:
+                    raise ValueError(f"Column {column} is declared by both {producer} and {node.key}")
+
+            self.nodes.setdefault(node.key, node)
+            if node.outputs not in self.outputs.setdefault(node.key, []):
+                self.outputs[node.key].append(node.outputs)
+            for column in node.outputs:
+                self.producers[column] = node.key
+
+    def plan(self) -> list:
+        """
+        :return: node keys in levels, the inputs of a level are all produced by earlier levels
+                 or are columns of the data itself
+        :rtype: list
+        :raises ValueError: when the nodes depend on each other in a cycle
+        """
+        dependencies = {key: {self.producers[column] for column in node.inputs if column in self.producers}
+                        for key, node in self.nodes.items()}
+        levels, done = [], set()
+        while len(done) < len(dependencies):
+            level = [key for key, needs in dependencies.items() if key not in done and needs <= done]
+            if not level:
+                cycle = [key for key in dependencies if key not in done]
+                raise ValueError(f"Indicators depend on each other in a cycle: {cycle}")
+            levels.append(level)
+            done.update(level)
+        return levels
+
+    def evaluate(self, dataframe: DataFrame, executor: IndicatorExecutor = INDICATOR_EXECUTOR,
+                 cache: IndicatorCache = INDICATOR_CACHE) -> DataFrame:
+        """
+        :param dataframe: OHLCV data of one pair
+        :type dataframe: DataFrame
+        :param executor: threads the nodes of a level run on
+        :type executor: IndicatorExecutor
+        :param cache: where node results are kept
+        :type cache: IndicatorCache
+        :return: the same dataframe with every output column filled in
+        :rtype: DataFrame
+        """
+        stamps = dataframe.attrs.setdefault(STAMPS, {})
+        for level in self.plan():
+            expected = {key: self.stamp(dataframe, key, cache) for key in level}
+            missing = [key for key in level
+                       if any(stamps.get(column) != expected[key] for outputs in self.outputs[key] for column in outputs)]
+            if not missing:
+                continue
+
+            results = executor.map(lambda key: self.nodes[key].compute(dataframe, cache), missing)
+
+            for key, arrays in zip(missing, results):
+                for outputs in self.outputs[key]:
+                    for column, values in zip(outputs, arrays):
+                        dataframe[column] = np.array(values, copy=True)
+                        stamps[column] = expected[key]
+
+        return dataframe
+
+    def stamp(self, dataframe: DataFrame, key: tuple, cache: IndicatorCache = INDICATOR_CACHE) -> tuple:
+        """
+        :param dataframe: frame holding the inputs of the node
+        :type dataframe: DataFrame
+        :param key: node key
+        :type key: tuple
+        :param cache: where the fingerprints of the frame are memoized
+        :type cache: IndicatorCache
+        :return: what the output columns of the node hold when computed from the frame
+        :rtype: tuple
+        """
+        return key, tuple(cache.fingerprint(dataframe, column) for column in self.nodes[key].inputs)
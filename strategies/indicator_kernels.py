@@ -0,0 +1,464 @@
+# NumPy indicator kernels
+#
+# Work on plain arrays without building intermediate DataFrames. The NumPy kernels run along
+# the last axis, so a (pairs x candles) matrix is handled in the same call as one series.
+# Rows may start with NaN, e.g. the warm-up of a TA-Lib indicator or a pair listed later,
+# the kernels start at the first value of every row. ewm_mean also takes NaN in between,
+# linear_recurrence rejects them, the TA-Lib equivalents (ema, rsi, atr) carry them on to
+# the end of the row as TA-Lib does.
+
+import numpy as np
+import talib as ta
+
+try:
+    from scipy.signal import lfilter
+except ImportError:  # optional, the block recurrence gives the same results
+    lfilter = None
+
+# largest growth of the rescaled values inside one block of linear_recurrence
+_BLOCK_GROWTH = 1e2
+
+
+def linear_recurrence(values, decay, initial=0.0):
+    """
+    Computes z_t = x_t + decay * z_t-1 along the last axis without a Python loop per candle.
+    With SciPy installed this is scipy.signal.lfilter, a C loop over every row. Otherwise
+    the series is cut into blocks. Inside a block the recurrence is a cumulative sum of
+    values rescaled by decay^-k, the blocks are then chained by their carries. Blocks are as
+    long as the rescaling stays within decay^-block <= _BLOCK_GROWTH, so a carry fades by a
+    factor decay^block >= 1 / _BLOCK_GROWTH per block, just above it for long blocks. About
+    log(eps) / log(1 / _BLOCK_GROWTH), i.e. 8, terms are enough to chain them.
+    Leading NaN of a row are skipped: the row starts from initial at its first value and is
+    NaN before it.
+
+    :param values: x, oldest first
+    :type values: ndarray
+    :param decay: factor in [0, 1)
+    :type decay: float
+    :param initial: z before the first value, scalar or one value per row
+    :return: z, same shape as values
+    :rtype: ndarray
+    :raises ValueError: for infinite values and for NaN after the first value of a row
+    """
+    values = np.asarray(values, dtype=float)
+    if not 0 <= decay < 1:
+        raise ValueError(f"decay must be in [0, 1), got {decay}")
+    missing = np.isnan(values)
+    if not missing.any():
+        if not np.isfinite(values).all():
+            raise ValueError("linear_recurrence takes no infinite values")
+        return _recurrence(values, decay, initial)
+
+    started = _started(missing)
+    if (started & missing).any():
+        raise ValueError("linear_recurrence takes NaN only before the first value of a row")
+    if not np.isfinite(values[started]).all():
+        raise ValueError("linear_recurrence takes no infinite values")
+    # zeros before the first value keep z at zero, the first value takes up decay * initial
+    shifted = np.where(started, values, 0.0)
+    rows = shifted.reshape(-1, values.shape[-1])
+    first = _first_values(started.reshape(rows.shape))
+    present = first < rows.shape[1]
+    initial = np.broadcast_to(initial, values.shape[:-1]).reshape(-1)
+    rows[present, first[present]] += decay * initial[present]
+    result = _recurrence(shifted, decay, 0.0)
+    result[~started] = np.nan
+    return result
+
+
+def _started(missing) -> np.ndarray:
+    """
+    :return: True from the first value of every row on
+    """
+    return np.logical_or.accumulate(~missing, axis=-1)
+
+
+def _first_values(present) -> np.ndarray:
+    """
+    :param present: (rows x candles) True on the candles with a value, or output of _started
+    :return: candle of the first value per row, the number of candles for rows without values
+    """
+    return np.where(present.any(axis=1), present.argmax(axis=1), present.shape[1])
+
+
+def _recurrence(values, decay, initial):
+    """
+    linear_recurrence on values without NaN.
+    """
+    if decay == 0 or values.shape[-1] == 0:
+        return values.copy()
+    if lfilter is not None:
+        initial = np.broadcast_to(initial, values.shape[:-1])
+        return lfilter([1.0], [1.0, -decay], values, axis=-1, zi=decay * initial[..., np.newaxis])[0]
+
+    length = values.shape[-1]
+    initial = np.array(np.broadcast_to(initial, values.shape[:-1]), dtype=float)
+    block = min(length, max(1, int(np.log(_BLOCK_GROWTH) / -np.log(decay))))
+    blocks = -(-length // block)
+
+    padded = np.zeros(values.shape[:-1] + (blocks * block,))
+    padded[..., :length] = values
+    padded = padded.reshape(values.shape[:-1] + (blocks, block))
+
+    # recurrence inside every block, starting from zero
+    scale = decay ** np.arange(block)
+    local = scale * np.cumsum(padded / scale, axis=-1)
+
+    # carry out of every block: c_b = end_b + fade * c_b-1, with c_-1 = initial
+    ends = local[..., -1]
+    fade = decay ** block
+    carries = ends.copy()
+    lag, weight = 1, fade
+    while lag < blocks and weight > np.finfo(float).eps:
+        carries[..., lag:] += weight * ends[..., :-lag]
+        lag, weight = lag + 1, weight * fade
+    carries += fade ** np.arange(1, blocks + 1) * initial[..., np.newaxis]
+
+    incoming = np.concatenate([initial[..., np.newaxis], carries[..., :-1]], axis=-1)
+    result = local + decay * scale * incoming[..., np.newaxis]
+
+    return result.reshape(values.shape[:-1] + (blocks * block,))[..., :length]
+
+
+def ewm_mean(values, alpha, adjust=True):
+    """
+    Exponentially weighted mean, same as pandas' ewm(alpha=alpha, adjust=adjust).mean().
+    NaN are handled as there with ignore_na=False: the mean starts at the first value of a
+    row, a NaN candle repeats the mean before it and still ages the earlier values.
+
+    :param values: values, oldest first
+    :type values: ndarray
+    :param alpha: smoothing factor in (0, 1]
+    :type alpha: float
+    :param adjust: divide by the sum of the weights seen so far instead of seeding with the first value
+    :type adjust: bool
+    :return: smoothed values
+    :rtype: ndarray
+    :raises ValueError: for infinite values
+    """
+    values = np.asarray(values, dtype=float)
+    decay = 1 - alpha
+    missing = np.isnan(values)
+    if missing.any():
+        return _ewm_mean_missing(values, missing, alpha, adjust)
+    if adjust:
+        # the sum of the weights reaches 1 within rounding after a few hundred candles
+        length = values.shape[-1]
+        settled = min(length, int(np.log(np.finfo(float).eps) / np.log(decay)) + 1 if decay > 0 else 1)
+        scale = np.full(length, alpha)
+        scale[:settled] /= 1 - decay ** np.arange(1, settled + 1)
+        return linear_recurrence(values, decay) * scale
+    # y_0 = x_0, so z_-1 has to make alpha * x_0 + decay * z_-1 equal x_0
+    return linear_recurrence(alpha * values, decay, initial=values[..., 0])
+
+
+def _ewm_mean_missing(values, missing, alpha, adjust):
+    """
+    ewm_mean of values with NaN.
+    """
+    decay = 1 - alpha
+    shape, length = values.shape, values.shape[-1]
+    rows, missing = values.reshape(-1, length), missing.reshape(-1, length)
+    started = _started(missing)
+    if adjust:
+        # weighted sum over the weights of the values seen so far, NaN candles weigh nothing
+        total = linear_recurrence(np.where(started & missing, 0.0, rows), decay)
+        weights = linear_recurrence(np.where(started, ~missing, np.nan), decay)
+        with np.errstate(invalid='ignore'):
+            # 0 / 0 on NaN candles when the decay is 0, those are replaced below
+            smoothed = total / weights
+    else:
+        smoothed = np.full(rows.shape, np.nan)
+        # the NaN after the last value of a row do not change its mean
+        ended = _started(missing[:, ::-1])[:, ::-1]
+        gaps = (started & ended & missing).any(axis=1)
+        plain = np.flatnonzero(~gaps)
+        if len(plain):
+            inputs = np.where(ended[plain], rows[plain], 0.0)
+            inputs[~started[plain]] = np.nan
+            first = np.minimum(_first_values(started[plain]), length - 1)
+            initial = rows[plain, first]
+            smoothed[plain] = linear_recurrence(alpha * inputs, decay, initial=initial)
+        for row in np.flatnonzero(gaps):
+            smoothed[row] = _ewm_mean_runs(rows[row], alpha)
+
+    # a NaN candle repeats the mean of the last value before it
+    previous = np.maximum.accumulate(np.where(missing, -1, np.arange(length)), axis=1)
+    result = np.take_along_axis(smoothed, np.maximum(previous, 0), axis=1)
+    result[previous < 0] = np.nan
+    return result.reshape(shape)
+
+
+def _ewm_mean_runs(values, alpha):
+    """
+    ewm_mean(values, alpha, adjust=False) of one series with NaN in between, NaN on the NaN candles.
+    """
+    decay = 1 - alpha
+    result = np.full(len(values), np.nan)
+    positions = np.flatnonzero(~np.isnan(values))
+    mean, last = None, None
+    # runs of consecutive values, after a gap of k candles the mean restarts from
+    # (decay^k * mean + alpha * x) / (decay^k + alpha)
+    for run in np.split(positions, np.flatnonzero(np.diff(positions) > 1) + 1):
+        start, end = run[0], run[-1] + 1
+        if mean is None:
+            mean = values[start]
+        else:
+            weight = decay ** (start - last)
+            mean = (weight * mean + alpha * values[start]) / (weight + alpha)
+        result[start] = mean
+        result[start + 1:end] = linear_recurrence(alpha * values[start + 1:end], decay, initial=mean)
+        mean, last = result[end - 1], end - 1
+    return result
+
+
+def true_range(high, low, close):
+    """
+    :return: max(high - low, |high - previous close|, |low - previous close|), the first candle uses high - low
+    :rtype: ndarray
+    """
+    high, low, close = (np.asarray(values, dtype=float) for values in (high, low, close))
+    result = high - low
+    previous = close[..., :-1]
+    np.maximum(result[..., 1:], np.abs(high[..., 1:] - previous), out=result[..., 1:])
+    np.maximum(result[..., 1:], np.abs(low[..., 1:] - previous), out=result[..., 1:])
+    return result
+
+
+def keltner_channel(high, low, close, kc_lookback, multiplier, atr_lookback):
+    """
+    Keltner channel from a single kernel: true range, its exponential smoothing and the
+    exponential midline, without intermediate frames.
+
+    :param kc_lookback: center of mass of the midline, as in close.ewm(kc_lookback)
+    :type kc_lookback: float
+    :param multiplier: channel width in ATRs
+    :type multiplier: float
+    :param atr_lookback: ATR smoothing period, as in tr.ewm(alpha=1 / atr_lookback)
+    :type atr_lookback: float
+    :return: middle, upper and lower band
+    :rtype: tuple
+    """
+    width = multiplier * ewm_mean(true_range(high, low, close), 1 / atr_lookback)
+    middle = ewm_mean(close, 1 / (1 + kc_lookback))
+    return middle, middle + width, middle - width
+
+
+def ema(values, timeperiod=30):
+    """
+    Same values as ta.EMA(values, timeperiod) per row, up to rounding: the average is seeded
+    with the simple average of the first timeperiod values of the row.
+
+    :param values: one series or one row per series
+    :type values: ndarray
+    :param timeperiod: period, the smoothing factor is 2 / (timeperiod + 1)
+    :type timeperiod: int
+    :return: the average, NaN until the seed and, as in TA-Lib, from a NaN after the first value on
+    :rtype: ndarray
+    """
+    rows, shape = _as_rows(values)
+    first = _first_values(~np.isnan(rows))
+    factor = 2 / (timeperiod + 1)
+    seed = _window_mean(rows, first, timeperiod)
+    return _seeded(rows * factor, first + timeperiod - 1, seed, 1 - factor).reshape(shape)
+
+
+def rsi(close, timeperiod=14):
+    """
+    Same values as ta.RSI(close, timeperiod) per row, up to rounding: Wilder's averages of
+    the gains and losses, seeded with their simple averages over the first timeperiod changes.
+
+    :param close: one series or one row per series
+    :type close: ndarray
+    :param timeperiod: period of the averages
+    :type timeperiod: int
+    :return: RSI in [0, 100], NaN until the seed and, as in TA-Lib, from a NaN after the first value on
+    :rtype: ndarray
+    """
+    rows, shape = _as_rows(close)
+    first = _first_values(~np.isnan(rows))
+    gain = np.empty(rows.shape)
+    gain[:, 0] = 0.0
+    np.subtract(rows[:, 1:], rows[:, :-1], out=gain[:, 1:])
+    loss = np.negative(gain)
+    np.maximum(gain, 0.0, out=gain)
+    np.maximum(loss, 0.0, out=loss)
+
+    averages = []
+    for moves in (gain, loss):
+        seed = _window_mean(moves, first + 1, timeperiod)
+        moves /= timeperiod
+        averages.append(_seeded(moves, first + timeperiod, seed, 1 - 1 / timeperiod))
+    gain, loss = averages
+    total = gain + loss
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = 100 * gain / total
+    # TA-Lib gives 0 when both averages are within 1e-8 of zero
+    result[np.abs(total) < 1e-8] = 0.0
+    return result.reshape(shape)
+
+
+def atr(high, low, close, timeperiod=14):
+    """
+    Same values as ta.ATR(high, low, close, timeperiod) per row, up to rounding: Wilder's
+    average of the true range, seeded with its simple average over the first timeperiod candles
+    that have a previous close.
+
+    :param high: one series or one row per series
+    :type high: ndarray
+    :param timeperiod: period of the average
+    :type timeperiod: int
+    :return: the average true range, NaN until the seed and, as in TA-Lib, from a NaN after the
+             first candle on
+    :rtype: ndarray
+    """
+    (high, shape), (low, _), (close, _) = (_as_rows(values) for values in (high, low, close))
+    first = _first_values(~(np.isnan(high) | np.isnan(low) | np.isnan(close)))
+    ranges = true_range(high, low, close)
+    # the first candle of a row has no previous close
+    rows = np.flatnonzero(first < ranges.shape[1])
+    ranges[rows, first[rows]] = np.nan
+    if timeperiod <= 1:
+        return ranges.reshape(shape)
+    seed = _window_mean(ranges, first + 1, timeperiod)
+    ranges /= timeperiod
+    return _seeded(ranges, first + timeperiod, seed, 1 - 1 / timeperiod).reshape(shape)
+
+
+def _as_rows(values) -> tuple:
+    """
+    :return: values as (rows x candles) and their original shape
+    """
+    values = np.asarray(values, dtype=float)
+    return values.reshape(-1, values.shape[-1]), values.shape
+
+
+def _window_mean(rows, start, timeperiod) -> np.ndarray:
+    """
+    :return: per row the average of timeperiod values from start on, anything for rows too short
+    """
+    candles = np.minimum(start[:, np.newaxis] + np.arange(timeperiod), rows.shape[1] - 1)
+    return np.take_along_axis(rows, candles, axis=1).mean(axis=1)
+
+
+def _seeded(increments, seeded, seed, decay) -> np.ndarray:
+    """
+    :param increments: (rows x candles) x_t of z_t = x_t + decay * z_t-1, overwritten
+    :param seeded: per row the candle of the seed, rows with no seed have the number of candles
+    :param seed: per row the value of z on that candle
+    :return: NaN before the seed, the seed and the recurrence from there on
+    """
+    length = increments.shape[1]
+    # rows mostly share their first candle, one slice per distinct seed candle
+    starts = [(candle, np.flatnonzero(seeded == candle)) for candle in np.unique(seeded)]
+    for candle, rows in starts:
+        # zeros keep z at zero up to the seed candle, which then sets z to the seed
+        increments[rows, :candle] = 0.0
+        if candle < length:
+            increments[rows, candle] = seed[rows]
+    result = _recurrence(increments, decay, 0.0)
+    for candle, rows in starts:
+        result[rows, :candle] = np.nan
+    return result
+
+
+def bbands(close, timeperiod=5, nbdevup=2.0, nbdevdn=2.0, matype=0) -> tuple:
+    """
+    ta.BBANDS on the rows of close, see bollinger_bands.
+
+    :return: upper, middle and lower band
+    :rtype: tuple
+    """
+    return bollinger_bands(close, timeperiod, ((nbdevup, nbdevdn),), matype)
+
+
+def bollinger_bands(close, timeperiod=5, deviations=((2.0, 2.0),), matype=0):
+    """
+    Any number of Bollinger bands around the same moving average. The average and the
+    standard deviation are computed once, each band is a multiple of the deviation.
+    Same values as ta.BBANDS(close, timeperiod, nbdevup, nbdevdn, matype) per band, up to rounding.
+    The simple average (matype 0) and the deviation are sums over the window of all rows at
+    once, a value only affects the windows holding it. Other averages run through TA-Lib row by row.
+
+    :param close: close prices, one series or one row per series
+    :type close: ndarray
+    :param timeperiod: window of the average and the deviation
+    :type timeperiod: int
+    :param deviations: (nbdevup, nbdevdn) per band, e.g. ((2.0, 2.0), (1.0, 1.0)) for nested bands
+    :type deviations: tuple
+    :param matype: TA-Lib moving average type of the middle band
+    :type matype: int
+    :return: upper, middle and lower band for every entry of deviations, in that order
+    :rtype: tuple
+    """
+    close = np.asarray(close, dtype=float)
+    if matype == 0:
+        middle, deviation = _window_deviation(close, timeperiod)
+    else:
+        middle, = apply_rows(ta.MA, close, timeperiod=timeperiod, matype=matype)
+        deviation, = apply_rows(ta.STDDEV, close, timeperiod=timeperiod, nbdev=1)
+
+    bands = []
+    for up, down in deviations:
+        bands.extend((middle + up * deviation, middle, middle - down * deviation))
+    return tuple(bands)
+
+
+def _window_deviation(values, timeperiod) -> tuple:
+    """
+    :return: simple average and population standard deviation over the last timeperiod values,
+             NaN for the first timeperiod - 1 candles
+    """
+    length = values.shape[-1]
+    middle = np.full(values.shape, np.nan)
+    deviation = np.full(values.shape, np.nan)
+    if length < timeperiod:
+        return middle, deviation
+
+    # one shifted view per position in the window, summed in place
+    windows = [values[..., offset:length - timeperiod + 1 + offset] for offset in range(timeperiod)]
+    mean = windows[0].copy()
+    for window in windows[1:]:
+        mean += window
+    mean /= timeperiod
+    variance = np.zeros(mean.shape)
+    spread = np.empty(mean.shape)
+    for window in windows:
+        np.subtract(window, mean, out=spread)
+        spread *= spread
+        variance += spread
+    variance /= timeperiod
+
+    middle[..., timeperiod - 1:] = mean
+    np.sqrt(variance, out=deviation[..., timeperiod - 1:])
+    # TA-Lib rounds variances below 1e-8 down to a zero deviation
+    deviation[..., timeperiod - 1:][variance < 1e-8] = 0.0
+    return middle, deviation
+
+
+def apply_rows(function, *inputs, **params) -> tuple:
+    """
+    Runs a function of single series on every row of its inputs, e.g. on (pairs x candles)
+    matrices. Fallback for TA-Lib functions without a kernel above: TA-Lib takes one series
+    per call, so the rows are fed to it one by one and the results written into
+    preallocated matrices.
+
+    :param function: e.g. talib.RSI
+    :type function: callable
+    :param inputs: input arrays of the same shape, one series or one row per series
+    :param params: parameters of the function, e.g. timeperiod=14
+    :return: one array of the input shape per output of the function
+    :rtype: tuple
+    """
+    inputs = [np.asarray(values, dtype=float) for values in inputs]
+    shape = inputs[0].shape
+    rows = [values.reshape(-1, shape[-1]) for values in inputs]
+    outputs = None
+    for row in range(rows[0].shape[0]):
+        result = function(*(values[row] for values in rows), **params)
+        result = tuple(result) if isinstance(result, (tuple, list)) else (result,)
+        if outputs is None:
+            outputs = tuple(np.empty(rows[0].shape) for _ in result)
+        for output, values in zip(outputs, result):
+            output[row] = values
+    return tuple(output.reshape(shape) for output in outputs or ())
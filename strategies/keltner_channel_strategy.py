@@ -1,7 +1,9 @@
 # Mandatory Imports
 # Optional Imports
-import talib.abstract as ta
 import pandas as pd
+from indicator_kernels import keltner_channel
+from indicator_graph import COMMON_INDICATORS, IndicatorGraph, IndicatorNode
+from signal_expressions import SignalExpression
 
 from backtesting.strategy import Strategy
 
@@ -11,19 +13,25 @@ class KeltnerChannelStrategy(Strategy):
     This is an example custom strategy, that inherits from the main Strategy class
     """
 
-    def get_kc(self, high, low, close, kc_lookback, multiplier, atr_lookback):
-        tr1 = pd.DataFrame(high - low)
-        tr2 = pd.DataFrame(abs(high - close.shift()))
-        tr3 = pd.DataFrame(abs(low - close.shift()))
-        frames = [tr1, tr2, tr3]
-        tr = pd.concat(frames, axis=1, join='inner').max(axis=1)
-        atr = tr.ewm(alpha=1 / atr_lookback).mean()
-
-        kc_middle = close.ewm(kc_lookback).mean()
-        kc_upper = close.ewm(kc_lookback).mean() + multiplier * atr
-        kc_lower = close.ewm(kc_lookback).mean() - multiplier * atr
-
-        return kc_middle, kc_upper, kc_lower
+    indicators = COMMON_INDICATORS + [
+        # keltner channels: true range, its smoothing and the midline in one kernel.
+        # The ATR here is an adjusted ewm over atr_lookback, so the atr column can not be reused
+        IndicatorNode(('kc_middle', 'kc_upper', 'kc_lower'), keltner_channel, ('high', 'low', 'close'),
+                      kc_lookback=20, multiplier=2, atr_lookback=10),
+    ]
+
+    buy_conditions = SignalExpression("""
+        (rsi < 30) &
+        (close < kc_lower) &
+        (volume > 0)
+    """)
+
+    sell_conditions = SignalExpression("""
+        (rsi > 70) &
+        (ema5 < ema21) &
+        (volume > 0) &
+        (close > kc_upper)
+    """)
 
     def generate_indicators(self, dataframe: pd.DataFrame) -> pd.DataFrame:
         """
@@ -32,22 +40,7 @@ class KeltnerChannelStrategy(Strategy):
         :return: Dataframe filled with indicator-data
         :rtype: DataFrame
         """
-        # RSI - Relative Strength Index
-        dataframe['rsi'] = ta.RSI(dataframe, timeperiod=14)
-        # EMA - Exponential Moving Average
-        dataframe['ema5'] = ta.EMA(dataframe, timeperiod=5)
-        dataframe['ema21'] = ta.EMA(dataframe, timeperiod=21)
-        # ATR - Average True Range
-        dataframe['atr'] = ta.ATR(dataframe['high'], dataframe['low'], dataframe['close'], timeperiod=14)
-        #keltner channels
-        dataframe['kc_middle'], dataframe['kc_upper'], dataframe['kc_lower'] = self.get_kc(dataframe['high'],
-                                                                                           dataframe['low'],
-                                                                                           dataframe['close'],
-                                                                                           20,
-                                                                                           2,
-                                                                                           10)
-
-        return dataframe
+        return IndicatorGraph(self.indicators).evaluate(dataframe)
 
     def buy_signal(self, dataframe: pd.DataFrame) -> pd.DataFrame:
         """
@@ -58,13 +51,7 @@ class KeltnerChannelStrategy(Strategy):
         """
         # BEGIN STRATEGY
 
-        dataframe.loc[
-            (
-                (dataframe['rsi'] < 30) &
-                (dataframe['close'] < dataframe['kc_lower']) &
-                (dataframe['volume'] > 0)
-            ),
-            'buy'] = 1
+        dataframe['buy'] = self.buy_conditions.evaluate(dataframe)
 
         # END STRATEGY
 
@@ -79,14 +66,7 @@ class KeltnerChannelStrategy(Strategy):
         """
         # BEGIN STRATEGY
 
-        dataframe.loc[
-            (
-                (dataframe['rsi'] > 70) &
-                (dataframe['ema5'] < dataframe['ema21']) &
-                (dataframe['volume'] > 0) &
-                (dataframe['close'] > dataframe['kc_upper'])
-            ),
-            'sell'] = 1
+        dataframe['sell'] = self.sell_conditions.evaluate(dataframe)
 
         # END STRATEGY
 
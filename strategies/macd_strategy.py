@@ -2,7 +2,8 @@
 from pandas import DataFrame
 
 # Optional Imports
-import talib.abstract as ta
+from indicator_graph import COMMON_INDICATORS, IndicatorGraph, IndicatorNode
+from signal_expressions import SignalExpression
 
 from backtesting.strategy import Strategy
 
@@ -12,6 +13,24 @@ class MacdStrategy(Strategy):
     This is an example custom strategy for advanced users, that inherits from the main Strategy class
     """
 
+    indicators = COMMON_INDICATORS + [
+        # MACD
+        IndicatorNode(('MACD', 'MACDsignal', 'MACDhist'), 'MACD', fastperiod=12, slowperiod=26, signalperiod=9),
+    ]
+
+    buy_conditions = SignalExpression("""
+        (rsi < 50) &
+        (volume > 0) &
+        crossed_above(MACD, MACDsignal)
+    """)
+
+    sell_conditions = SignalExpression("""
+        (rsi > 50) &
+        (ema5 < ema21) &
+        (volume > 0) &
+        crossed_below(MACD, MACDsignal)
+    """)
+
     def generate_indicators(self, dataframe: DataFrame) -> DataFrame:
         """
         :param dataframe: All passed candles (current candle included!) with OHLCV data
@@ -19,20 +38,7 @@ class MacdStrategy(Strategy):
         :return: Dataframe filled with indicator-data
         :rtype: DataFrame
         """
-        # RSI - Relative Strength Index
-        dataframe['rsi'] = ta.RSI(dataframe, timeperiod=14)
-        # ATR - Average True Range
-        dataframe['atr'] = ta.ATR(dataframe['high'], dataframe['low'], dataframe['close'], timeperiod=14)
-        # EMA - Exponential Moving Average
-        dataframe['ema5'] = ta.EMA(dataframe, timeperiod=5)
-        dataframe['ema21'] = ta.EMA(dataframe, timeperiod=21)
-        # MACD
-        dataframe['MACD'], dataframe['MACDsignal'], dataframe['MACDhist'] = ta.MACD(dataframe.close,
-                                                                                    fastperiod=12,
-                                                                                    slowperiod=26,
-                                                                                    signalperiod=9)
-
-        return dataframe
+        return IndicatorGraph(self.indicators).evaluate(dataframe)
 
     def buy_signal(self, dataframe: DataFrame) -> DataFrame:
         """
@@ -43,14 +49,7 @@ class MacdStrategy(Strategy):
         """
         # BEGIN STRATEGY
 
-        dataframe.loc[
-            (
-                (dataframe['rsi'] < 50) &
-                (dataframe['volume'] > 0) &
-                (dataframe['MACD'] > dataframe['MACDsignal']) &
-                (dataframe.shift(1)['MACD'] <= dataframe.shift(1)['MACDsignal'])
-            ),
-            'buy'] = 1
+        dataframe['buy'] = self.buy_conditions.evaluate(dataframe)
 
         # END STRATEGY
 
@@ -65,15 +64,7 @@ class MacdStrategy(Strategy):
         """
         # BEGIN STRATEGY
 
-        dataframe.loc[
-            (
-                (dataframe['rsi'] > 50) &
-                (dataframe['ema5'] < dataframe['ema21']) &
-                (dataframe['volume'] > 0) &
-                (dataframe['MACD'] < dataframe['MACDsignal']) &
-                (dataframe.shift(1)['MACD'] >= dataframe.shift(1)['MACDsignal'])
-            ),
-            'sell'] = 1
+        dataframe['sell'] = self.sell_conditions.evaluate(dataframe)
 
         # END STRATEGY
 
@@ -1,7 +1,8 @@
 # Mandatory Imports
 # Optional Imports
-import talib.abstract as ta
 from pandas import DataFrame
+from indicator_cache import cached_indicator
+from signal_expressions import SignalExpression
 
 from backtesting.strategy import Strategy
 
@@ -11,6 +12,17 @@ class MyStrategy(Strategy):
     This is an example custom strategy, that inherits from the main Strategy class
     """
 
+    buy_conditions = SignalExpression("""
+        (rsi < 30) &
+        (ema5 < ema21) &
+        (volume > 0)
+    """)
+
+    sell_conditions = SignalExpression("""
+        (rsi > 70) &
+        (volume > 0)
+    """)
+
     def generate_indicators(self, dataframe: DataFrame) -> DataFrame:
         """
         :param dataframe: All passed candles (current candle included!) with OHLCV data
@@ -19,11 +31,11 @@ class MyStrategy(Strategy):
         :rtype: DataFrame
         """
         # RSI - Relative Strength Index
-        dataframe['rsi'] = ta.RSI(dataframe, timeperiod=14)
+        dataframe['rsi'] = cached_indicator('RSI', dataframe, timeperiod=14)
 
         # EMA - Exponential Moving Average
-        dataframe['ema5'] = ta.EMA(dataframe, timeperiod=5)
-        dataframe['ema21'] = ta.EMA(dataframe, timeperiod=21)
+        dataframe['ema5'] = cached_indicator('EMA', dataframe, timeperiod=5)
+        dataframe['ema21'] = cached_indicator('EMA', dataframe, timeperiod=21)
 
         return dataframe
 
@@ -36,13 +48,7 @@ class MyStrategy(Strategy):
         """
         # BEGIN STRATEGY
 
-        dataframe.loc[
-            (
-                (dataframe['rsi'] < 30) &
-                (dataframe['ema5'] < dataframe['ema21']) &
-                (dataframe['volume'] > 0)
-            ),
-            'buy'] = 1
+        dataframe['buy'] = self.buy_conditions.evaluate(dataframe)
 
         # END STRATEGY
 
@@ -57,12 +63,7 @@ class MyStrategy(Strategy):
         """
         # BEGIN STRATEGY
 
-        dataframe.loc[
-            (
-                (dataframe['rsi'] > 70) &
-                (dataframe['volume'] > 0)
-            ),
-            'sell'] = 1
+        dataframe['sell'] = self.sell_conditions.evaluate(dataframe)
 
         # END STRATEGY
 
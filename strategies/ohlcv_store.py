@@ -0,0 +1,193 @@
+# Columnar, memory mapped OHLCV store for data/backtesting-data
+#
+# Every pair and timeframe gets a directory with one raw contiguous array per field:
+# time.i8 holds the candle open times in milliseconds since the epoch (ascending, like
+# ccxt), open/high/low/close/volume.f8 the candle values. meta.json records the number of
+# rows and the first and last time. The sorted time column is the index: a time range is
+# two binary searches on it, and loading that range is a zero-copy slice of the mapped
+# files, no parsing involved.
+#
+# Writers append to the arrays first and replace meta.json last, readers only look at the
+# rows meta.json counts, so a reader never sees a partially written candle.
+
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+FIELDS = ('open', 'high', 'low', 'close', 'volume')
+_TIME_FILE = 'time.i8'
+_META_FILE = 'meta.json'
+
+
+def to_milliseconds(moment) -> int:
+    """
+    :param moment: date string like "2021-03-01", Timestamp or milliseconds since the epoch
+    :return: milliseconds since the epoch, naive times are taken as UTC
+    :rtype: int
+    """
+    if isinstance(moment, (int, np.integer)):
+        return int(moment)
+    timestamp = pd.Timestamp(moment)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert('UTC').tz_localize(None)
+    return timestamp.value // 10 ** 6
+
+
+class OhlcvStore:
+    """
+    One directory per exchange, pair and timeframe, e.g. data/backtesting-data/binance/ETH_USDT/5m
+    """
+
+    def __init__(self, directory: str = 'data/backtesting-data', exchange: str = 'binance'):
+        self.directory = directory
+        self.exchange = exchange
+
+    def path(self, pair: str, timeframe: str) -> str:
+        return os.path.join(self.directory, self.exchange, pair.replace('/', '_'), timeframe)
+
+    def meta(self, pair: str, timeframe: str) -> dict:
+        """
+        :return: rows, first and last candle time in milliseconds, None if nothing is stored
+        :rtype: dict
+        """
+        try:
+            with open(os.path.join(self.path(pair, timeframe), _META_FILE)) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def last_timestamp(self, pair: str, timeframe: str) -> int:
+        """
+        :return: open time of the last stored candle in milliseconds, None if nothing is stored
+        :rtype: int
+        """
+        meta = self.meta(pair, timeframe)
+        return meta['last'] if meta and meta['rows'] else None
+
+    def write(self, pair: str, timeframe: str, dataframe: DataFrame):
+        """
+        Replaces everything stored for the pair and timeframe.
+
+        :param dataframe: candles with a DatetimeIndex, or a "time" column in milliseconds
+        :type dataframe: DataFrame
+        """
+        path = self.path(pair, timeframe)
+        os.makedirs(path, exist_ok=True)
+        self._write_meta(path, {'rows': 0, 'first': None, 'last': None})
+        for name in (_TIME_FILE,) + tuple(field + '.f8' for field in FIELDS):
+            open(os.path.join(path, name), 'wb').close()
+        self.append(pair, timeframe, dataframe)
+
+    def append(self, pair: str, timeframe: str, dataframe: DataFrame) -> int:
+        """
+        Appends the candles that are newer than the last stored one.
+
+        :param dataframe: candles with a DatetimeIndex, or a "time" column in milliseconds
+        :type dataframe: DataFrame
+        :return: number of appended candles
+        :rtype: int
+        """
+        path = self.path(pair, timeframe)
+        meta = self.meta(pair, timeframe) or {'rows': 0, 'first': None, 'last': None}
+        time = _times(dataframe)
+        order = np.argsort(time, kind='stable')
+        time = time[order]
+        keep = np.ones(len(time), dtype=bool)
+        keep[1:] = time[1:] != time[:-1]
+        if meta['rows']:
+            keep &= time > meta['last']
+        if not keep.any():
+            return 0
+
+        os.makedirs(path, exist_ok=True)
+        rows = meta['rows']
+        columns = {_TIME_FILE: time[keep]}
+        for field in FIELDS:
+            columns[field + '.f8'] = dataframe[field].to_numpy(dtype=np.float64)[order][keep]
+        for name, values in columns.items():
+            with open(os.path.join(path, name), 'r+b' if rows else 'wb') as file:
+                # drop anything past the committed rows, e.g. from an interrupted append
+                file.truncate(rows * 8)
+                file.seek(rows * 8)
+                file.write(np.ascontiguousarray(values).tobytes())
+
+        appended = int(keep.sum())
+        self._write_meta(path, {
+            'rows': rows + appended,
+            'first': meta['first'] if rows else int(columns[_TIME_FILE][0]),
+            'last': int(columns[_TIME_FILE][-1]),
+        })
+        return appended
+
+    def arrays(self, pair: str, timeframe: str, start=None, end=None) -> dict:
+        """
+        :param start: first candle time to include, date string, Timestamp or milliseconds
+        :param end: candle time to stop before
+        :return: memory mapped time and field arrays of the range, without copying
+        :rtype: dict
+        """
+        meta = self.meta(pair, timeframe)
+        if meta is None:
+            raise FileNotFoundError(f"No candles stored for {pair} {timeframe} in {self.directory}")
+        path = self.path(pair, timeframe)
+        rows = meta['rows']
+        if rows == 0:
+            return {name: np.empty(0, dtype=np.int64 if name == 'time' else np.float64)
+                    for name in ('time',) + FIELDS}
+
+        # copy on write mappings: the file never changes, pages are only copied when written to
+        time = np.memmap(os.path.join(path, _TIME_FILE), dtype=np.int64, mode='c', shape=(rows,))
+        begin = 0 if start is None else int(np.searchsorted(time, to_milliseconds(start), side='left'))
+        stop = rows if end is None else int(np.searchsorted(time, to_milliseconds(end), side='left'))
+
+        arrays = {'time': time[begin:stop]}
+        for field in FIELDS:
+            values = np.memmap(os.path.join(path, field + '.f8'), dtype=np.float64, mode='c', shape=(rows,))
+            arrays[field] = values[begin:stop]
+        return arrays
+
+    def load(self, pair: str, timeframe: str, start=None, end=None) -> DataFrame:
+        """
+        :param start: first candle time to include, e.g. config["backtesting-from"]
+        :param end: candle time to stop before, e.g. config["backtesting-to"], None for everything stored
+        :return: candles indexed by open time, the columns share memory with the mapped files
+        :rtype: DataFrame
+        """
+        arrays = self.arrays(pair, timeframe, start, end)
+        index = pd.DatetimeIndex(arrays.pop('time').view('datetime64[ms]'), copy=False, name='time')
+        return DataFrame(arrays, index=index, copy=False)
+
+    def load_config(self, config: dict) -> dict:
+        """
+        :param config: contents of config.json
+        :type config: dict
+        :return: candles per pair for the configured timeframe and backtesting range
+        :rtype: dict
+        """
+        end = None if config.get('backtesting-till-now') else config.get('backtesting-to')
+        return {pair: self.load(pair, config['timeframe'], config.get('backtesting-from'), end)
+                for pair in config['pairs']}
+
+    @staticmethod
+    def _write_meta(path: str, meta: dict):
+        handle, temp_path = tempfile.mkstemp(dir=path, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'w') as file:
+                json.dump(meta, file)
+            os.replace(temp_path, os.path.join(path, _META_FILE))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+
+def _times(dataframe: DataFrame) -> np.ndarray:
+    if 'time' in dataframe:
+        return dataframe['time'].to_numpy(dtype=np.int64)
+    index = dataframe.index
+    if getattr(index, 'tz', None) is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+    return np.asarray(index.values, dtype='datetime64[ms]').view(np.int64)
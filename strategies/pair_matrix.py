@@ -0,0 +1,200 @@
+# Pairs as rows: batched indicators for many pairs
+#
+# The candles of all pairs are aligned on the union of their candle times and stored as one
+# (pairs x candles) matrix per column, NaN where a pair has no candle. Indicator nodes are
+# evaluated once per matrix, not once per pair and strategy: EMA, RSI, ATR and BBANDS nodes
+# and the NumPy kernels take the whole matrix in one call, along the candle axis. Other
+# TA-Lib functions have no kernel, they run over the matrix rows straight into preallocated
+# output matrices (see indicator_kernels.apply_rows). No per pair frames, fingerprints or
+# cache lookups are built on the way. A pair that starts later, ends earlier or misses
+# candles is computed on its own candles only, so its values are the ones of its own frame.
+#
+# frame(pair) gives the usual per pair DataFrame for the strategy API, its columns are
+# views of the matrix rows, stamped like IndicatorGraph.evaluate stamps them so the graph of
+# the strategy does not compute them again. Columns the strategy adds afterwards only live
+# in that frame.
+
+import numpy as np
+import talib
+from pandas import DataFrame
+
+from indicator_cache import INDICATOR_CACHE
+from indicator_graph import STAMPS, IndicatorGraph
+from indicator_kernels import apply_rows, atr, bbands, bollinger_bands, ema, keltner_channel, rsi
+from ohlcv_store import FIELDS
+
+# callables that work along the last axis of a matrix
+_BATCHED_FUNCTIONS = {bollinger_bands, keltner_channel}
+# TA-Lib functions with a kernel along the last axis, same values up to rounding
+_TALIB_KERNELS = {'EMA': ema, 'RSI': rsi, 'ATR': atr, 'BBANDS': bbands}
+# those of them TA-Lib can run with an unstable period, the kernels assume none
+_UNSTABLE_PERIODS = ('EMA', 'RSI', 'ATR')
+
+
+class PairMatrix:
+    """
+    One (pairs x candles) matrix per column, rows in the order of pairs.
+    """
+
+    def __init__(self, pairs: list, index, columns: dict, valid=None):
+        """
+        :param pairs: e.g. ["ETH/USDT", "COMP/USDT"]
+        :type pairs: list
+        :param index: candle times of all pairs
+        :type index: DatetimeIndex
+        :param columns: column name -> matrix with one row per pair
+        :type columns: dict
+        :param valid: (pairs x candles) mask of the candles each pair has, every pair has every candle if None
+        :type valid: ndarray
+        """
+        self.pairs = list(pairs)
+        self.index = index
+        self.columns = columns
+        self.valid = None if valid is None or valid.all() else np.asarray(valid, dtype=bool)
+        self._rows = {pair: row for row, pair in enumerate(self.pairs)}
+        # column -> graph and key of the node that computed it
+        self._producers = {}
+
+    @classmethod
+    def from_dataframes(cls, dataframes: dict, columns=FIELDS):
+        """
+        :param dataframes: OHLCV data per pair, e.g. {"ETH/USDT": DataFrame}
+        :type dataframes: dict
+        :param columns: columns to take over
+        :type columns: tuple
+        :return: matrices over the candle times of all pairs
+        :rtype: PairMatrix
+        """
+        pairs = list(dataframes)
+        index = None
+        for dataframe in dataframes.values():
+            index = dataframe.index if index is None or index.equals(dataframe.index) else index.union(dataframe.index)
+
+        valid = np.zeros((len(pairs), len(index)), dtype=bool)
+        positions = []
+        for row, pair in enumerate(pairs):
+            position = slice(None) if dataframes[pair].index.equals(index) else index.get_indexer(dataframes[pair].index)
+            valid[row, position] = True
+            positions.append(position)
+
+        matrices = {}
+        for column in columns:
+            matrix = np.full((len(pairs), len(index)), np.nan)
+            for row, pair in enumerate(pairs):
+                matrix[row, positions[row]] = dataframes[pair][column].to_numpy(dtype=float)
+            matrices[column] = matrix
+        return cls(pairs, index, matrices, valid)
+
+    def __getitem__(self, column: str) -> np.ndarray:
+        return self.columns[column]
+
+    def __setitem__(self, column: str, matrix):
+        self.columns[column] = np.asarray(matrix)
+        self._producers.pop(column, None)
+
+    def __contains__(self, column: str) -> bool:
+        return column in self.columns
+
+    def evaluate(self, nodes):
+        """
+        :param nodes: indicator nodes, e.g. the indicators of one or more strategies, or an IndicatorGraph
+        :type nodes: list or IndicatorGraph
+        :return: the same matrix with every output column filled in
+        :rtype: PairMatrix
+        """
+        graph = nodes if isinstance(nodes, IndicatorGraph) else IndicatorGraph(nodes)
+        for level in graph.plan():
+            for key in level:
+                if all(column in self for outputs in graph.outputs[key] for column in outputs):
+                    continue
+                arrays = self._compute(graph.nodes[key])
+                for outputs in graph.outputs[key]:
+                    for column, values in zip(outputs, arrays):
+                        self.columns[column] = np.array(values, dtype=float, copy=True)
+                        self._producers[column] = graph, key
+        return self
+
+    def _compute(self, node) -> tuple:
+        inputs = [self.columns[column] for column in node.inputs]
+        if self.valid is None:
+            return self._compute_rows(node, inputs)
+
+        outputs = tuple(np.full(inputs[0].shape, np.nan) for _ in node.outputs)
+        complete = self.valid.all(axis=1)
+        rows = np.flatnonzero(complete)
+        if len(rows):
+            for output, values in zip(outputs, self._compute_rows(node, [values[rows] for values in inputs])):
+                output[rows] = values
+        # every other pair on its own candles
+        for row in np.flatnonzero(~complete):
+            candles = self.valid[row]
+            if candles.any():
+                for output, values in zip(outputs, self._compute_rows(node, [values[row, candles] for values in inputs])):
+                    output[row, candles] = values
+        return outputs
+
+    @staticmethod
+    def _compute_rows(node, inputs) -> tuple:
+        if isinstance(node.function, str):
+            name = node.function.upper()
+            kernel = _talib_kernel(name)
+            if kernel is None or not _leading_nan_only(inputs):
+                return apply_rows(getattr(talib, name), *inputs, **node.resolved)
+            result = kernel(*inputs, **node.resolved)
+        elif node.function in _BATCHED_FUNCTIONS:
+            result = node.function(*inputs, **node.params)
+        else:
+            return apply_rows(node.function, *inputs, **node.params)
+        return tuple(result) if len(node.outputs) > 1 else (result,)
+
+    def frame(self, pair: str) -> DataFrame:
+        """
+        :param pair: e.g. "ETH/USDT"
+        :type pair: str
+        :return: candles and indicators of the pair, the columns share memory with the matrices
+                 unless the pair misses candles in between
+        :rtype: DataFrame
+        """
+        row = self._rows[pair]
+        candles = slice(None)
+        if self.valid is not None:
+            positions = np.flatnonzero(self.valid[row])
+            contiguous = len(positions) and positions[-1] - positions[0] + 1 == len(positions)
+            # a slice keeps the columns views, candles missing in between need a copy
+            candles = slice(positions[0], positions[-1] + 1) if contiguous else positions
+        dataframe = DataFrame({column: matrix[row, candles] for column, matrix in self.columns.items()},
+                              index=self.index[candles], copy=False)
+        dataframe.attrs[STAMPS] = {column: graph.stamp(dataframe, key, INDICATOR_CACHE)
+                                   for column, (graph, key) in self._producers.items()}
+        return dataframe
+
+    def frames(self) -> dict:
+        """
+        :return: frame per pair, e.g. to hand to the per pair strategy flow
+        :rtype: dict
+        """
+        return {pair: self.frame(pair) for pair in self.pairs}
+
+
+def _talib_kernel(name: str):
+    """
+    :return: kernel of the TA-Lib function, None when there is none or TA-Lib is set to seed
+             its averages differently than the kernels do
+    """
+    if name not in _TALIB_KERNELS or talib.get_compatibility():
+        return None
+    if name in _UNSTABLE_PERIODS and talib.get_unstable_period(name):
+        return None
+    return _TALIB_KERNELS[name]
+
+
+def _leading_nan_only(inputs) -> bool:
+    """
+    :return: whether every row of the inputs has NaN only before its first value
+    """
+    for values in inputs:
+        present = ~np.isnan(values).reshape(-1, values.shape[-1])
+        first = np.where(present.any(axis=1), present.argmax(axis=1), present.shape[1])
+        if (present.sum(axis=1) != present.shape[1] - first).any():
+            return False
+    return True
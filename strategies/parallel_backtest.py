@@ -0,0 +1,175 @@
+# Per pair backtests in a process pool
+#
+# Until trades compete for capital the pairs are independent: indicators, signals, the
+# stoploss column and the exits of the trades of one pair never look at another. The OHLCV
+# arrays of every pair are placed in shared memory once, the workers of a process pool map
+# them instead of receiving pickled frames, run the strategy on the pair and send back the
+# trade of every buy candle. merge_trades then walks the trades of all pairs in entry
+# order and applies "max-open-trades" and "starting-capital", see portfolio.
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from arima_pool import pool_size
+from exit_sweep import PairSignals
+from ohlcv_store import FIELDS
+from portfolio import allocate
+from trade_simulator import simulation_settings
+
+# blocks attached by this worker process, by name, kept open for the life of the process
+_ATTACHED = {}
+
+
+class SharedCandles:
+    """
+    OHLCV arrays of every pair in shared memory: one block per pair holding the candle times
+    as int64 nanoseconds followed by one float64 row per field.
+    Use as a context manager, the blocks are released on exit.
+    """
+
+    def __init__(self, dataframes: dict):
+        """
+        :param dataframes: OHLCV data per pair, e.g. {"ETH/USDT": DataFrame}
+        :type dataframes: dict
+        """
+        self.blocks = {}
+        self.descriptors = {}
+        try:
+            for pair, dataframe in dataframes.items():
+                rows = len(dataframe)
+                block = shared_memory.SharedMemory(create=True, size=max(1, (1 + len(FIELDS)) * rows * 8))
+                self.blocks[pair] = block
+                times = np.ndarray((rows,), dtype=np.int64, buffer=block.buf)
+                times[:] = np.asarray(dataframe.index.values, dtype='datetime64[ns]').view(np.int64)
+                values = np.ndarray((len(FIELDS), rows), dtype=np.float64, buffer=block.buf, offset=rows * 8)
+                for row, field in enumerate(FIELDS):
+                    values[row] = dataframe[field].to_numpy(dtype=np.float64)
+                self.descriptors[pair] = (block.name, rows)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def attach(descriptor: tuple) -> DataFrame:
+    """
+    :param descriptor: (block name, rows) from SharedCandles.descriptors
+    :type descriptor: tuple
+    :return: read-only candles of one pair, the columns map the shared block without copying
+    :rtype: DataFrame
+    """
+    name, rows = descriptor
+    block = _ATTACHED.get(name)
+    if block is None:
+        try:
+            block = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:  # Python < 3.13 has no track argument
+            block = shared_memory.SharedMemory(name=name)
+        _ATTACHED[name] = block
+
+    times = np.ndarray((rows,), dtype=np.int64, buffer=block.buf)
+    values = np.ndarray((len(FIELDS), rows), dtype=np.float64, buffer=block.buf, offset=rows * 8)
+    values.flags.writeable = False
+    index = pd.DatetimeIndex(times.view('datetime64[ns]'), name='time')
+    return DataFrame(dict(zip(FIELDS, values)), index=index, copy=False)
+
+
+def backtest_pair(strategy, dataframe: DataFrame, settings: dict) -> DataFrame:
+    """
+    :param strategy: strategy instance
+    :param dataframe: OHLCV data of one pair
+    :type dataframe: DataFrame
+    :param settings: keyword arguments for simulate_trades, see simulation_settings
+    :type settings: dict
+    :return: one trade per buy candle of the pair, they may overlap, merge_trades picks the ones taken
+    :rtype: DataFrame
+    """
+    dataframe = strategy.generate_indicators(dataframe)
+    dataframe = strategy.buy_signal(dataframe)
+    dataframe = strategy.sell_signal(dataframe)
+    if settings['stoploss_type'] == 'dynamic':
+        dataframe = strategy.stoploss(dataframe)
+    return PairSignals(dataframe).candidate_trades(**settings)
+
+
+def _backtest_shared(strategy, descriptor: tuple, settings: dict) -> DataFrame:
+    return backtest_pair(strategy, attach(descriptor), settings)
+
+
+def backtest_pairs(strategy, dataframes: dict, config: dict, max_workers: int = None) -> dict:
+    """
+    :param strategy: strategy instance, it is pickled to the workers
+    :param dataframes: OHLCV data per pair, e.g. {"ETH/USDT": DataFrame}
+    :type dataframes: dict
+    :param config: contents of config.json
+    :type config: dict
+    :param max_workers: upper bound for the pool size
+    :type max_workers: int
+    :return: trades of every buy candle per pair, see backtest_pair
+    :rtype: dict
+    """
+    settings = simulation_settings(config)
+    if not dataframes:
+        return {}
+
+    with SharedCandles(dataframes) as candles, \
+            ProcessPoolExecutor(pool_size(len(dataframes), max_workers)) as pool:
+        futures = {pair: pool.submit(_backtest_shared, strategy, descriptor, settings)
+                   for pair, descriptor in candles.descriptors.items()}
+        return {pair: future.result() for pair, future in futures.items()}
+
+
+def merge_trades(trades: dict, max_open_trades: int, starting_capital: float) -> DataFrame:
+    """
+    Walks the trades of all pairs in entry order and takes them as allocate does: one open
+    trade per pair, at most max_open_trades open trades, the free capital divided over the
+    free slots.
+
+    :param trades: trades per pair, e.g. from backtest_pairs or simulate_trades
+    :type trades: dict
+    :param max_open_trades: e.g. config["max-open-trades"]
+    :type max_open_trades: int
+    :param starting_capital: e.g. config["starting-capital"]
+    :type starting_capital: float
+    :return: the trades taken, in entry order, with pair, stake, absolute profit and the capital after every exit
+    :rtype: DataFrame
+    """
+    frames = [frame.assign(pair=pair) for pair, frame in trades.items() if len(frame)]
+    if not frames:
+        return DataFrame(columns=['pair', 'stake_amount', 'profit_abs', 'capital'])
+    # ties in entry time go in the order of the pairs
+    candidates = pd.concat(frames, ignore_index=True).sort_values('entry_time', kind='stable')
+
+    taken, stakes, capital = allocate(candidates['entry_time'].to_numpy(), candidates['exit_time'].to_numpy(),
+                                      candidates['profit_ratio'].to_numpy(dtype=float),
+                                      max_open_trades, starting_capital,
+                                      pd.factorize(candidates['pair'])[0])
+    merged = candidates.iloc[taken].reset_index(drop=True)
+    merged['stake_amount'] = stakes
+    merged['profit_abs'] = stakes * merged['profit_ratio'].to_numpy(dtype=float)
+    merged['capital'] = capital
+    return merged[['pair'] + [column for column in merged.columns if column != 'pair']]
+
+
+def backtest_config(strategy, dataframes: dict, config: dict, max_workers: int = None) -> DataFrame:
+    """
+    :return: trades of all pairs after applying "max-open-trades" and "starting-capital"
+    :rtype: DataFrame
+    """
+    trades = backtest_pairs(strategy, dataframes, config, max_workers)
+    return merge_trades(trades, config['max-open-trades'], config['starting-capital'])
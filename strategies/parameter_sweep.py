@@ -0,0 +1,191 @@
+# Parameter sweeps over strategy indicators
+#
+# A search space maps parameters to the values to try. "column.param" changes a parameter
+# of the indicator node producing that column, e.g. "rsi.timeperiod" or "bband_up.deviations",
+# a plain name sets a strategy attribute, e.g. "buy_conditions". Combinations come from a
+# grid or from random sampling.
+#
+# Combinations are fanned out over a process pool in runs of neighbours, the candles sit in
+# shared memory once. Within a worker every indicator node result is kept in the indicator
+# cache, keyed by the node and its input data, so a combination only computes the nodes
+# whose parameters changed: sweeping the RSI period reuses the EMA, ATR, MACD, ... of the
+# first combination. The workers only use the in-memory tier, most combinations are never
+# computed again and would only fill the disk cache. Results are yielded as they finish,
+# Leaderboard keeps them ranked.
+
+import copy
+import heapq
+import itertools
+import os
+import random
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+import indicator_cache
+from indicator_graph import IndicatorNode
+from parallel_backtest import SharedCandles, attach, backtest_pair, merge_trades
+from portfolio import portfolio_summary
+from trade_simulator import simulation_settings
+
+
+def grid(space: dict):
+    """
+    :param space: parameter -> values, e.g. {"rsi.timeperiod": [7, 14, 21], "trix.timeperiod": [14, 21]}
+    :type space: dict
+    :return: every combination, the last parameter changes fastest
+    :rtype: generator
+    """
+    names = list(space)
+    for values in itertools.product(*(space[name] for name in names)):
+        yield dict(zip(names, values))
+
+
+def random_search(space: dict, samples: int, seed: int = None):
+    """
+    :param space: parameter -> values to draw from
+    :type space: dict
+    :param samples: number of distinct combinations, fewer if the grid is smaller
+    :type samples: int
+    :param seed: seed of the random generator
+    :type seed: int
+    :return: combinations drawn without repetition
+    :rtype: generator
+    """
+    generator = random.Random(seed)
+    sizes = [len(space[name]) for name in space]
+    total = int(np.prod(sizes, dtype=object))
+    # draw grid positions, then decode them into one value per parameter
+    for position in generator.sample(range(total), min(samples, total)):
+        combination = {}
+        for name, size in zip(reversed(list(space)), reversed(sizes)):
+            position, choice = divmod(position, size)
+            combination[name] = space[name][choice]
+        yield dict(reversed(combination.items()))
+
+
+def apply_parameters(strategy, parameters: dict):
+    """
+    :param strategy: strategy instance with an indicators attribute
+    :param parameters: one combination, e.g. {"rsi.timeperiod": 21}
+    :type parameters: dict
+    :return: shallow copy of the strategy with the parameters applied
+    :raises ValueError: when no indicator produces the column of a parameter
+    """
+    strategy = copy.copy(strategy)
+    nodes = list(getattr(strategy, 'indicators', ()))
+    for name, value in parameters.items():
+        if '.' not in name:
+            setattr(strategy, name, value)
+            continue
+        column, parameter = name.split('.', 1)
+        for position, node in enumerate(nodes):
+            if column in node.outputs:
+                nodes[position] = IndicatorNode(node.outputs, node.function, node.inputs,
+                                                **{**node.params, parameter: value})
+                break
+        else:
+            raise ValueError(f"No indicator produces column {column} of parameter {name}")
+    strategy.indicators = nodes
+    return strategy
+
+
+def evaluate_combination(strategy, parameters: dict, dataframes: dict, config: dict) -> dict:
+    """
+    :param dataframes: OHLCV data per pair
+    :type dataframes: dict
+    :param config: contents of config.json
+    :type config: dict
+    :return: the parameters with the outcome of the portfolio after "max-open-trades"
+    :rtype: dict
+    """
+    strategy = apply_parameters(strategy, parameters)
+    settings = simulation_settings(config)
+    trades = {pair: backtest_pair(strategy, dataframe, settings) for pair, dataframe in dataframes.items()}
+    merged = merge_trades(trades, config['max-open-trades'], config['starting-capital'])
+    return {'parameters': parameters, **portfolio_summary(merged['profit_abs'], config['starting-capital'])}
+
+
+class Leaderboard:
+    """
+    Best results seen so far by one metric.
+    """
+
+    def __init__(self, metric: str = 'profit_abs', top: int = 10):
+        self.metric = metric
+        self.top = top
+        self._heap = []
+        self._count = 0
+
+    def add(self, result: dict):
+        entry = (result[self.metric], -self._count, result)
+        self._count += 1
+        if len(self._heap) < self.top:
+            heapq.heappush(self._heap, entry)
+        elif entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+
+    def ranking(self) -> list:
+        """
+        :return: best results first, ties in the order they were added
+        :rtype: list
+        """
+        return [result for *_, result in sorted(self._heap, key=lambda entry: entry[:2], reverse=True)]
+
+
+def sweep(strategy, combinations, dataframes: dict, config: dict, max_workers: int = None,
+          chunk_size: int = 8, cache_entries: int = 1024):
+    """
+    :param strategy: strategy instance, it is pickled to the workers
+    :param combinations: parameter combinations, e.g. grid(space) or random_search(space, 500)
+    :param dataframes: OHLCV data per pair
+    :type dataframes: dict
+    :param config: contents of config.json
+    :type config: dict
+    :param max_workers: upper bound for the pool size
+    :type max_workers: int
+    :param chunk_size: consecutive combinations evaluated by one worker, neighbours in a grid
+                       share most indicators
+    :type chunk_size: int
+    :param cache_entries: in-memory indicator results kept per worker
+    :type cache_entries: int
+    :return: one result per combination, in the order they finish
+    :rtype: generator
+    """
+    chunks = _chunks(combinations, chunk_size)
+    workers = max(1, max_workers or os.cpu_count() or 1)
+
+    with SharedCandles(dataframes) as candles, \
+            ProcessPoolExecutor(workers, initializer=_start_worker, initargs=(cache_entries,)) as pool:
+        pending = set()
+        while True:
+            # keep every worker busy without queueing the whole search space
+            for chunk in itertools.islice(chunks, 2 * workers - len(pending)):
+                pending.add(pool.submit(_evaluate_chunk, strategy, chunk, candles.descriptors, config))
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+
+
+def _chunks(combinations, size):
+    iterator = iter(combinations)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _start_worker(cache_entries):
+    # the in-memory tier holds the node results shared between combinations, the disk tier is left alone
+    cache = indicator_cache.INDICATOR_CACHE
+    cache.max_entries = max(cache.max_entries, cache_entries)
+    cache.persist = False
+
+
+def _evaluate_chunk(strategy, chunk, descriptors, config):
+    return [evaluate_combination(strategy, parameters, {pair: attach(descriptor) for pair, descriptor in descriptors.items()},
+                                 config)
+            for parameters in chunk]
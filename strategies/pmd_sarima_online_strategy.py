@@ -1,20 +1,53 @@
 # Mandatory Imports
 # Optional Imports
+import numpy as np
 import pandas as pd
-import talib.abstract as ta
-import pmdarima as pmd
+from arima_cache import cached_auto_arima
+from arima_pool import add_forecast, fit_forecasts
+from arima_state_space import ArimaStateSpace
+from indicator_cache import cached_indicator
+from signal_expressions import SignalExpression
 
 from backtesting.strategy import Strategy
 
 
+def arima_forecast(close: pd.Series) -> np.ndarray:
+    """
+    Fits the forecast for one pair, module level so arima_pool.fit_forecasts can run it in a worker process.
+    """
+    # order selection is cached on disk, reruns on the same data skip the search
+    arima_model = cached_auto_arima(close, seasonal=False, stepwise=True)
+    # one-step-ahead forecast per candle, the order is fixed and the filter state advances in O(1)
+    return ArimaStateSpace.from_pmdarima(arima_model).filter(close.values)
+
+
 class PmdSarimaOnlineStrategy(Strategy):
     """
     This is an example custom strategy, that inherits from the main Strategy class
     """
 
-    def update_arima(self, arima_model, row):
-        arima_model.update(pd.Series(row['close']))
-        return arima_model.predict(n_periods=1, return_conf_int=False)
+    buy_conditions = SignalExpression("""
+        (rsi < 30) &
+        (volume > 0) &
+        (forecast > close)
+    """)
+
+    sell_conditions = SignalExpression("""
+        (rsi > 70) &
+        (volume > 0) &
+        (forecast < close)
+    """)
+
+    def prepare_pairs(self, dataframes: dict) -> dict:
+        """
+        Fits the forecasts of all pairs in parallel, before the per pair flow.
+
+        :param dataframes: OHLCV data per pair
+        :type dataframes: dict
+        :return: the same dataframes with the forecast column filled in
+        :rtype: dict
+        """
+        return fit_forecasts(dataframes, arima_forecast)
 
     def generate_indicators(self, dataframe: pd.DataFrame) -> pd.DataFrame:
         """
@@ -23,15 +56,15 @@ class PmdSarimaOnlineStrategy(Strategy):
         :return: Dataframe filled with indicator-data
         :rtype: DataFrame
         """
-        dataframe['rsi'] = ta.RSI(dataframe, timeperiod=14)
-        dataframe['ema5'] = ta.EMA(dataframe, timeperiod=5)
+        dataframe['rsi'] = cached_indicator('RSI', dataframe, timeperiod=14)
+        dataframe['ema5'] = cached_indicator('EMA', dataframe, timeperiod=5)
         # ATR - Average True Range
-        dataframe['atr'] = ta.ATR(dataframe['high'], dataframe['low'], dataframe['close'], timeperiod=14)
+        dataframe['atr'] = cached_indicator('ATR', dataframe, timeperiod=14)
 
         # SARIMA
         slice_size = 10
-        arima_model = pmd.auto_arima(dataframe['close'], seasonal=False, stepwise=True)
-        dataframe['forecast'] = dataframe.apply(lambda x: self.update_arima(arima_model, x), axis=1)
+        # fitted in advance by prepare_pairs unless the closes changed since
+        dataframe = add_forecast(dataframe, arima_forecast)
 
         print(dataframe)
 
@@ -46,13 +79,7 @@ class PmdSarimaOnlineStrategy(Strategy):
         """
         # BEGIN STRATEGY
 
-        dataframe.loc[
-            (
-                (dataframe['rsi'] < 30) &
-                (dataframe['volume'] > 0) &
-                (dataframe['forecast'] > dataframe['close'])
-            ),
-            'buy'] = 1
+        dataframe['buy'] = self.buy_conditions.evaluate(dataframe)
 
         # END STRATEGY
 
@@ -67,13 +94,7 @@ class PmdSarimaOnlineStrategy(Strategy):
         """
         # BEGIN STRATEGY
 
-        dataframe.loc[
-            (
-                (dataframe['rsi'] > 70) &
-                (dataframe['volume'] > 0) &
-                (dataframe['forecast'] < dataframe['close'])
-            ),
-            'sell'] = 1
+        dataframe['sell'] = self.sell_conditions.evaluate(dataframe)
 
         # END STRATEGY
 
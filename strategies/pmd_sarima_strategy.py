@@ -1,17 +1,71 @@
 # Mandatory Imports
 # Optional Imports
 import pandas as pd
-import talib.abstract as ta
-import pmdarima as pmd
+import numpy as np
+from arima_cache import cached_auto_arima
+from arima_pool import add_forecast, fit_forecasts
+from arima_search import seasonal_order_search
+from arima_walk_forward import arima_trend, walk_forward_forecast
+from indicator_cache import cached_indicator
+from signal_expressions import SignalExpression
 
 from backtesting.strategy import Strategy
 
+# seasonal model with m=7, d=1, D=1 from an exhaustive order search instead of the stepwise one
+SEASONAL_SEARCH = False
+# candles between refits of the walk-forward forecast, lower is fresher but costs more CPU
+REFIT_EVERY = 288
+# candles the order is selected on, the forecast starts after them
+MIN_TRAIN = 288
+
+
+def arima_forecast(close: pd.Series) -> np.ndarray:
+    """
+    Fits the forecast for one pair, module level so arima_pool.fit_forecasts can run it in a worker process.
+    """
+    # order selection is cached on disk, reruns on the same data skip the search
+    train = close.iloc[:MIN_TRAIN]
+    if SEASONAL_SEARCH:
+        # candidate models are fitted in parallel, every one of them like pmd.auto_arima(stepwise=False)
+        arima_model = cached_auto_arima(train, search=seasonal_order_search,
+                                        m=7, d=1, D=1, start_p=1, start_q=1, max_p=3, max_q=3)
+    else:
+        arima_model = cached_auto_arima(train, seasonal=False, stepwise=True)
+
+    # the order and the intercept stay fixed, the parameters are refitted every REFIT_EVERY candles
+    trend = arima_trend(arima_model.with_intercept, arima_model.order[1], arima_model.seasonal_order[1])
+    return walk_forward_forecast(close, arima_model.order, arima_model.seasonal_order, trend=trend,
+                                 refit_every=REFIT_EVERY, min_train=MIN_TRAIN)
+
 
 class PmdSarimaStrategy(Strategy):
     """
     This is an example custom strategy, that inherits from the main Strategy class
     """
 
+    buy_conditions = SignalExpression("""
+        (rsi < 30) &
+        (volume > 0) &
+        (forecast > close)
+    """)
+
+    sell_conditions = SignalExpression("""
+        (rsi > 70) &
+        (volume > 0) &
+        (forecast < close)
+    """)
+
+    def prepare_pairs(self, dataframes: dict) -> dict:
+        """
+        Fits the forecasts of all pairs in parallel, before the per pair flow.
+
+        :param dataframes: OHLCV data per pair
+        :type dataframes: dict
+        :return: the same dataframes with the forecast column filled in
+        :rtype: dict
+        """
+        return fit_forecasts(dataframes, arima_forecast)
+
     def generate_indicators(self, dataframe: pd.DataFrame) -> pd.DataFrame:
         """
         :param dataframe: All passed candles (current candle included!) with OHLCV data
@@ -19,33 +73,15 @@ class PmdSarimaStrategy(Strategy):
         :return: Dataframe filled with indicator-data
         :rtype: DataFrame
         """
-        dataframe['rsi'] = ta.RSI(dataframe, timeperiod=14)
-        dataframe['ema5'] = ta.EMA(dataframe, timeperiod=5)
+        dataframe['rsi'] = cached_indicator('RSI', dataframe, timeperiod=14)
+        dataframe['ema5'] = cached_indicator('EMA', dataframe, timeperiod=5)
         # ATR - Average True Range
-        dataframe['atr'] = ta.ATR(dataframe['high'], dataframe['low'], dataframe['close'], timeperiod=14)
+        dataframe['atr'] = cached_indicator('ATR', dataframe, timeperiod=14)
 
         # SARIMA
         slice_size = 10
-        '''
-        arima_model = pmd.auto_arima(dataframe['close'],
-                                     start_p=1,
-                                     start_q=1,
-                                     max_p=3,
-                                     max_q=3,
-                                     m=7,
-                                     start_P=0,
-                                     seasonal=True,
-                                     d=1,
-                                     D=1,
-                                     trace=True,
-                                     # don't want to know if an order does not work
-                                     error_action='ignore',
-                                     # don't want convergence warnings
-                                     suppress_warnings=True,
-                                     stepwise=False)  # set to stepwise
-        '''
-        arima_model = pmd.auto_arima(dataframe['close'], seasonal=False, stepwise=True)
-        dataframe['forecast'], conf_int = arima_model.predict(n_periods=len(dataframe), return_conf_int=True, alpha=0.05)
+        # fitted in advance by prepare_pairs unless the closes changed since
+        dataframe = add_forecast(dataframe, arima_forecast)
 
         print(dataframe)
 
@@ -60,13 +96,7 @@ class PmdSarimaStrategy(Strategy):
         """
         # BEGIN STRATEGY
 
-        dataframe.loc[
-            (
-                (dataframe['rsi'] < 30) &
-                (dataframe['volume'] > 0) &
-                (dataframe['forecast'] > dataframe['close'])
-            ),
-            'buy'] = 1
+        dataframe['buy'] = self.buy_conditions.evaluate(dataframe)
 
         # END STRATEGY
 
@@ -81,13 +111,7 @@ class PmdSarimaStrategy(Strategy):
         """
         # BEGIN STRATEGY
 
-        dataframe.loc[
-            (
-                (dataframe['rsi'] > 70) &
-                (dataframe['volume'] > 0) &
-                (dataframe['forecast'] < dataframe['close'])
-            ),
-            'sell'] = 1
+        dataframe['sell'] = self.sell_conditions.evaluate(dataframe)
 
         # END STRATEGY
 
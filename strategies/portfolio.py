@@ -0,0 +1,99 @@
+# Portfolio allocation over the trades of several pairs
+#
+# The exit of a trade only depends on its entry candle, so the trades of every buy candle
+# of a pair can be simulated on their own, before any pair competes for a slot. Walking
+# those candidates of all pairs in entry order and taking one whenever its pair has no
+# open trade and one of "max-open-trades" slots is free gives the same trades as a
+# portfolio backtest stepping through the candles of all pairs at once: a buy candle
+# skipped for lack of a slot leaves the pair free for its next buy candle.
+
+import heapq
+
+import numpy as np
+
+
+def allocate(entry_times, exit_times, ratios, max_open_trades: int, starting_capital: float,
+             pairs=None) -> tuple:
+    """
+    Takes a trade while its pair has no open trade and fewer than max_open_trades trades are
+    open, and stakes it with the free capital divided over the free slots. Trades closing on
+    the candle another one opens free their slot first, a pair enters again on a candle after
+    its exit.
+
+    :param entry_times: entry time per trade, sorted
+    :type entry_times: ndarray
+    :param exit_times: exit time per trade
+    :type exit_times: ndarray
+    :param ratios: profit ratio per trade
+    :type ratios: ndarray
+    :param max_open_trades: e.g. config["max-open-trades"]
+    :type max_open_trades: int
+    :param starting_capital: e.g. config["starting-capital"]
+    :type starting_capital: float
+    :param pairs: pair code per trade, None when the trades of a pair never overlap, e.g.
+                  the output of simulate_trades
+    :type pairs: ndarray
+    :return: positions of the trades taken, their stakes and the capital after each of their exits
+    :rtype: tuple
+    """
+    # plain Python numbers, the loop below touches every trade
+    entry_times, exit_times = (_as_integers(times) for times in (entry_times, exit_times))
+    ratios = np.asarray(ratios, dtype=float).tolist()
+    pairs = np.asarray(pairs).tolist() if pairs is not None else None
+
+    free, capital = starting_capital, starting_capital
+    open_trades = []  # (exit time, position, stake)
+    busy_until = {}  # exit time of the last trade taken per pair
+    taken, stakes = [], []
+    capital_after = [np.nan] * len(ratios)
+    for position in range(len(ratios)):
+        entry_time = entry_times[position]
+        while open_trades and open_trades[0][0] <= entry_time:
+            _, closed, stake = heapq.heappop(open_trades)
+            free += stake * (1 + ratios[closed])
+            capital += stake * ratios[closed]
+            capital_after[closed] = capital
+        if len(open_trades) >= max_open_trades:
+            continue
+        if pairs is not None:
+            pair = pairs[position]
+            if pair in busy_until and entry_time <= busy_until[pair]:
+                continue
+            busy_until[pair] = exit_times[position]
+        stake = free / (max_open_trades - len(open_trades))
+        free -= stake
+        heapq.heappush(open_trades, (exit_times[position], position, stake))
+        taken.append(position)
+        stakes.append(stake)
+    for _, closed, stake in sorted(open_trades):
+        capital += stake * ratios[closed]
+        capital_after[closed] = capital
+
+    taken = np.array(taken, dtype=np.int64)
+    return taken, np.array(stakes, dtype=float), np.array(capital_after)[taken]
+
+
+def _as_integers(times) -> list:
+    times = np.asarray(times)
+    if times.dtype.kind == 'M':
+        times = times.view(np.int64)
+    return times.tolist()
+
+
+def portfolio_summary(profits, starting_capital: float) -> dict:
+    """
+    :param profits: absolute profit per trade taken, e.g. merge_trades(...)["profit_abs"]
+    :type profits: ndarray
+    :param starting_capital: e.g. config["starting-capital"]
+    :type starting_capital: float
+    :return: total profit, profit in percent of the starting capital, number of trades and share of winners
+    :rtype: dict
+    """
+    profits = np.asarray(profits, dtype=float)
+    profit = float(profits.sum())
+    return {
+        'profit_abs': profit,
+        'profit_percent': 100 * profit / starting_capital,
+        'trades': len(profits),
+        'win_rate': float((profits > 0).mean()) if len(profits) else 0.0,
+    }
@@ -0,0 +1,49 @@
+# Stepped ROI table from config.json, e.g. {"0": 7, "60": 6, "120": 5}
+#
+# A trade is closed once its profit reaches the ROI of the time it has been open: 7% from
+# the start, 6% after 60 minutes and 5% after 120 minutes. The table is compiled once into
+# sorted breakpoints, so the thresholds of any number of open trades are one searchsorted.
+# For a fixed timeframe it can also be expanded into one threshold per candle since entry.
+
+import numpy as np
+
+from timeframes import timeframe_to_minutes
+
+
+class RoiTable:
+    """
+    Compiled ROI table, thresholds are in percent like in config.json.
+    """
+
+    def __init__(self, roi: dict):
+        """
+        :param roi: minutes since entry -> minimal profit in percent, e.g. {"0": 7, "60": 6}
+        :type roi: dict
+        """
+        steps = sorted((int(minutes), float(profit)) for minutes, profit in roi.items())
+        if not steps:
+            raise ValueError("The ROI table is empty")
+        self.breakpoints = np.array([minutes for minutes, _ in steps], dtype=np.int64)
+        self.thresholds = np.array([profit for _, profit in steps])
+
+    def threshold(self, minutes) -> np.ndarray:
+        """
+        :param minutes: time since entry per trade, in minutes
+        :type minutes: ndarray
+        :return: ROI in percent per trade, inf before the first breakpoint
+        :rtype: ndarray
+        """
+        step = np.searchsorted(self.breakpoints, minutes, side='right') - 1
+        # pad with inf in front so times before the first breakpoint get no ROI
+        return np.concatenate(([np.inf], self.thresholds))[step + 1]
+
+    def per_candle(self, timeframe: str) -> np.ndarray:
+        """
+        :param timeframe: e.g. "5m"
+        :type timeframe: str
+        :return: ROI in percent per candle since entry, the last value holds for all later candles
+        :rtype: ndarray
+        """
+        minutes = timeframe_to_minutes(timeframe)
+        candles = -(-int(self.breakpoints[-1]) // minutes) + 1
+        return self.threshold(np.arange(candles) * minutes)
@@ -1,17 +1,54 @@
 # Mandatory Imports
-from pandas import DataFrame
+import numpy as np
+from pandas import DataFrame, Series
 
 # Optional Imports
-import talib.abstract as ta
-from statsmodels.tsa.arima.model import ARIMA
+from arima_pool import add_forecast, fit_forecasts
+from arima_walk_forward import walk_forward_forecast
+from indicator_cache import cached_indicator
+from signal_expressions import SignalExpression
 from backtesting.strategy import Strategy
 
+# candles between refits of the walk-forward forecast, lower is fresher but costs more CPU
+REFIT_EVERY = 288
+
+
+def arima_forecast(close: Series) -> np.ndarray:
+    """
+    Fits the forecast for one pair, module level so arima_pool.fit_forecasts can run it in a worker process.
+    """
+    return walk_forward_forecast(close, order=(0, 0, 0), refit_every=REFIT_EVERY)
+
 
 class SarimaStrategy(Strategy):
     """
     This is an example custom strategy for advanced users, that inherits from the main Strategy class
     """
 
+    buy_conditions = SignalExpression("""
+        (rsi < 30) &
+        (volume > 0) &
+        (forecast > close)
+    """)
+
+    sell_conditions = SignalExpression("""
+        (rsi > 70) &
+        (ema5 < ema21) &
+        (volume > 0) &
+        (forecast < close)
+    """)
+
+    def prepare_pairs(self, dataframes: dict) -> dict:
+        """
+        Fits the forecasts of all pairs in parallel, before the per pair flow.
+
+        :param dataframes: OHLCV data per pair
+        :type dataframes: dict
+        :return: the same dataframes with the forecast column filled in
+        :rtype: dict
+        """
+        return fit_forecasts(dataframes, arima_forecast)
+
     def generate_indicators(self, dataframe: DataFrame) -> DataFrame:
         """
         :param dataframe: All passed candles (current candle included!) with OHLCV data
@@ -20,17 +57,14 @@ class SarimaStrategy(Strategy):
         :rtype: DataFrame
         """
         # RSI - Relative Strength Index
-        dataframe['rsi'] = ta.RSI(dataframe, timeperiod=14)
+        dataframe['rsi'] = cached_indicator('RSI', dataframe, timeperiod=14)
         # EMA - Exponential Moving Average
-        dataframe['ema5'] = ta.EMA(dataframe, timeperiod=5)
-        dataframe['ema21'] = ta.EMA(dataframe, timeperiod=21)
+        dataframe['ema5'] = cached_indicator('EMA', dataframe, timeperiod=5)
+        dataframe['ema21'] = cached_indicator('EMA', dataframe, timeperiod=21)
         # ATR - Average True Range
-        dataframe['atr'] = ta.ATR(dataframe['high'], dataframe['low'], dataframe['close'], timeperiod=14)
-        # ARIMA
-        arima = ARIMA(dataframe['close'], order=(0, 0, 0))
-        res_ar = arima.fit()
-        res_ar.summary()
-        dataframe['forecast'] = res_ar.predict(dataframe.index[0], dataframe.index[-1])
+        dataframe['atr'] = cached_indicator('ATR', dataframe, timeperiod=14)
+        # ARIMA, fitted in advance by prepare_pairs unless the closes changed since
+        dataframe = add_forecast(dataframe, arima_forecast)
 
         print(dataframe)
 
@@ -45,13 +79,7 @@ class SarimaStrategy(Strategy):
         """
         # BEGIN STRATEGY
 
-        dataframe.loc[
-            (
-                (dataframe['rsi'] < 30) &
-                (dataframe['volume'] > 0) &
-                (dataframe['forecast'] > dataframe['close'])
-            ),
-            'buy'] = 1
+        dataframe['buy'] = self.buy_conditions.evaluate(dataframe)
 
         # END STRATEGY
 
@@ -66,14 +94,7 @@ class SarimaStrategy(Strategy):
         """
         # BEGIN STRATEGY
 
-        dataframe.loc[
-            (
-                (dataframe['rsi'] > 70) &
-                (dataframe['ema5'] < dataframe['ema21']) &
-                (dataframe['volume'] > 0) &
-                (dataframe['forecast'] < dataframe['close'])
-            ),
-            'sell'] = 1
+        dataframe['sell'] = self.sell_conditions.evaluate(dataframe)
 
         # END STRATEGY
 
@@ -0,0 +1,260 @@
+# Compiled buy and sell conditions
+#
+# A condition is written once as an expression over column names, e.g.
+#   "(rsi < 30) & (volume > 0) & (close < bband_low)"
+# and evaluated in one fused pass over the underlying arrays: with numexpr when it is
+# installed, otherwise with NumPy ufuncs that write every intermediate result into a
+# small pool of reused buffers. No temporary Series are built per clause, and the signal
+# column is a compact int8 0/1 column instead of a float column that is NaN almost everywhere.
+#
+# Supported syntax: column names, numbers, + - * /, unary minus, single comparisons
+# (< <= > >= == !=), & | and ~. Comparisons with NaN are False, like in pandas. The
+# expression and the operands of & | ~ must be conditions, e.g. "close - open" is rejected.
+#
+# Earlier candles are read with prev(x), lag(x, n), crossed_above(a, b) and crossed_below(a, b).
+# These never shift or copy a column: past the first n candles, x lagged by n is a view
+# x[start - n:end - n] next to x[start:end]. Only the first n candles, where the lagged
+# values are NaN as with dataframe.shift(n), are evaluated on small padded copies.
+
+import ast
+from collections.abc import Mapping
+
+import numpy as np
+
+try:
+    import numexpr
+except ImportError:  # optional, the NumPy evaluator gives the same results
+    numexpr = None
+
+_COMPARISONS = {
+    ast.Lt: np.less,
+    ast.LtE: np.less_equal,
+    ast.Gt: np.greater,
+    ast.GtE: np.greater_equal,
+    ast.Eq: np.equal,
+    ast.NotEq: np.not_equal,
+}
+_OPERATORS = {
+    ast.BitAnd: np.logical_and,
+    ast.BitOr: np.logical_or,
+    ast.Add: np.add,
+    ast.Sub: np.subtract,
+    ast.Mult: np.multiply,
+    ast.Div: np.true_divide,
+}
+_UNARY = {
+    ast.Invert: np.logical_not,
+    ast.USub: np.negative,
+}
+
+
+class SignalExpression:
+    """
+    Boolean condition over the columns of a dataframe, parsed once and evaluated per call.
+    """
+
+    def __init__(self, expression: str, use_numexpr: bool = True):
+        """
+        :param expression: condition, may span several lines
+        :type expression: str
+        :param use_numexpr: evaluate with numexpr when it is installed
+        :type use_numexpr: bool
+        """
+        self.source = ' '.join(expression.split())
+        # variable -> (column, candles back), lags are pushed down to the column names
+        self.variables = {}
+        self.tree = self._expand(ast.parse(self.source, mode='eval').body, 0)
+        if not _is_condition(self.tree):
+            raise ValueError(f"Signal expression {self.source!r} is not a condition")
+        self.expression = ast.unparse(self.tree)
+        self.columns = list(dict.fromkeys(column for column, _ in self.variables.values()))
+        self.max_lag = max((periods for _, periods in self.variables.values()), default=0)
+        self.use_numexpr = use_numexpr and numexpr is not None
+
+    def _expand(self, node, periods):
+        """
+        :return: copy of the node with every column read periods candles back, lag functions
+                 and crossovers rewritten into plain comparisons of lagged columns
+        """
+        if isinstance(node, ast.Name):
+            variable = node.id if periods == 0 else f'{node.id}__lag{periods}'
+            self.variables[variable] = (node.id, periods)
+            return ast.Name(variable, ast.Load())
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+            return ast.Constant(node.value)
+        if isinstance(node, ast.BinOp) and type(node.op) in _OPERATORS:
+            return ast.BinOp(self._expand(node.left, periods), node.op, self._expand(node.right, periods))
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY:
+            return ast.UnaryOp(node.op, self._expand(node.operand, periods))
+        if isinstance(node, ast.Compare) and len(node.ops) == 1 and type(node.ops[0]) in _COMPARISONS:
+            return ast.Compare(self._expand(node.left, periods), node.ops,
+                               [self._expand(node.comparators[0], periods)])
+
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            function, arguments = node.func.id, node.args
+            if function == 'prev' and len(arguments) == 1:
+                return self._expand(arguments[0], periods + 1)
+            if function == 'lag' and len(arguments) == 2 and isinstance(arguments[1], ast.Constant) \
+                    and type(arguments[1].value) is int and arguments[1].value >= 0:
+                return self._expand(arguments[0], periods + arguments[1].value)
+            if function in ('crossed_above', 'crossed_below') and len(arguments) == 2:
+                # a > b now and a <= b one candle before, or the mirror image
+                now, before = (ast.Gt, ast.LtE) if function == 'crossed_above' else (ast.Lt, ast.GtE)
+                first, second = arguments
+                return ast.BinOp(
+                    ast.Compare(self._expand(first, periods), [now()], [self._expand(second, periods)]),
+                    ast.BitAnd(),
+                    ast.Compare(self._expand(first, periods + 1), [before()], [self._expand(second, periods + 1)]))
+
+        raise ValueError(f"Unsupported syntax in signal expression {self.source!r}: {ast.unparse(node)}")
+
+    def mask(self, data) -> np.ndarray:
+        """
+        :param data: dataframe, or arrays per column name, e.g. (pairs x candles) matrices
+        :type data: DataFrame or dict
+        :return: True where the condition holds
+        :rtype: ndarray
+        """
+        arrays = {column: np.asarray(data[column]) if isinstance(data, Mapping) else data[column].to_numpy()
+                  for column in self.columns}
+        if self.max_lag == 0:
+            return self._run({variable: arrays[column] for variable, (column, _) in self.variables.items()})
+
+        shape = np.broadcast_shapes(*(array.shape for array in arrays.values()))
+        length, head = shape[-1], min(self.max_lag, shape[-1])
+        result = np.empty(shape, dtype=bool)
+
+        # past the first max_lag candles every lagged column is a view into the column itself
+        if length > head:
+            result[..., head:] = self._run({
+                variable: arrays[column][..., head - periods:length - periods]
+                for variable, (column, periods) in self.variables.items()})
+
+        # the first candles read before the start of the data, those values are NaN
+        window = {}
+        for variable, (column, periods) in self.variables.items():
+            values = arrays[column]
+            if periods == 0:
+                window[variable] = values[..., :head]
+                continue
+            padded = np.full(values.shape[:-1] + (head,), np.nan)
+            available = max(0, head - periods)
+            padded[..., periods:] = values[..., :available]
+            window[variable] = padded
+        result[..., :head] = self._run(window)
+
+        return result
+
+    def _run(self, arrays) -> np.ndarray:
+        if self.use_numexpr:
+            return np.asarray(numexpr.evaluate(self.expression, local_dict=arrays), dtype=bool)
+        result, _ = self._evaluate(self.tree, arrays, [])
+        return np.asarray(result, dtype=bool)
+
+    def evaluate(self, data) -> np.ndarray:
+        """
+        :param data: dataframe, or arrays per column name
+        :type data: DataFrame or dict
+        :return: 1 where the condition holds, 0 elsewhere
+        :rtype: ndarray of int8
+        """
+        return self.mask(data).view(np.int8)
+
+    def _evaluate(self, node, arrays, free):
+        """
+        :return: value of the node and whether it is a temporary buffer that may be overwritten
+        """
+        if isinstance(node, ast.Name):
+            return arrays[node.id], False
+        if isinstance(node, ast.Constant):
+            return node.value, False
+
+        if isinstance(node, ast.Compare):
+            left, left_owned = self._evaluate(node.left, arrays, free)
+            right, right_owned = self._evaluate(node.comparators[0], arrays, free)
+            shape = np.broadcast_shapes(np.shape(left), np.shape(right))
+            out = self._buffer(free, shape, bool)
+            result = _COMPARISONS[type(node.ops[0])](left, right, out=out)
+            self._release(free, left, left_owned)
+            self._release(free, right, right_owned)
+            return result, True
+
+        if isinstance(node, ast.UnaryOp):
+            operand, owned = self._evaluate(node.operand, arrays, free)
+            function = _UNARY[type(node.op)]
+            if not isinstance(operand, np.ndarray):
+                return function(operand), False
+            return function(operand, out=operand) if owned else function(operand), True
+
+        left, left_owned = self._evaluate(node.left, arrays, free)
+        right, right_owned = self._evaluate(node.right, arrays, free)
+        function = _OPERATORS[type(node.op)]
+        dtype = bool if function in (np.logical_and, np.logical_or) else np.result_type(left, right, np.float64)
+        shape = np.broadcast_shapes(np.shape(left), np.shape(right))
+        # write into one of the operands when it is a temporary of the right shape and type
+        for operand, owned in ((left, left_owned), (right, right_owned)):
+            if owned and operand.shape == shape and operand.dtype == dtype:
+                result = function(left, right, out=operand)
+                other, other_owned = (right, right_owned) if operand is left else (left, left_owned)
+                self._release(free, other, other_owned)
+                return result, True
+        result = function(left, right, out=self._buffer(free, shape, dtype))
+        self._release(free, left, left_owned)
+        self._release(free, right, right_owned)
+        return result, True
+
+    @staticmethod
+    def _buffer(free, shape, dtype):
+        for index, buffer in enumerate(free):
+            if buffer.shape == shape and buffer.dtype == dtype:
+                return free.pop(index)
+        return np.empty(shape, dtype=dtype)
+
+    @staticmethod
+    def _release(free, value, owned):
+        if owned:
+            free.append(value)
+
+    def __repr__(self):
+        return f'SignalExpression({self.source!r})'
+
+
+def _is_condition(node) -> bool:
+    """
+    :return: whether the expanded node is a comparison, or & | ~ of comparisons
+    """
+    if isinstance(node, ast.Compare):
+        return True
+    if isinstance(node, ast.BinOp) and isinstance(node.op, (ast.BitAnd, ast.BitOr)):
+        return _is_condition(node.left) and _is_condition(node.right)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Invert):
+        return _is_condition(node.operand)
+    return False
+
+
+def crossed_above(first, second) -> np.ndarray:
+    """
+    :param first: e.g. the MACD line
+    :type first: ndarray or Series
+    :param second: e.g. the signal line, or a number
+    :type second: ndarray or Series or float
+    :return: first > second on a candle and first <= second on the candle before
+    :rtype: ndarray
+    """
+    first = np.asarray(first)
+    return SignalExpression('crossed_above(first, second)').mask({
+        'first': first, 'second': np.broadcast_to(second, first.shape)})
+
+
+def crossed_below(first, second) -> np.ndarray:
+    """
+    :param first: e.g. the MACD line
+    :type first: ndarray or Series
+    :param second: e.g. the signal line, or a number
+    :type second: ndarray or Series or float
+    :return: first < second on a candle and first >= second on the candle before
+    :rtype: ndarray
+    """
+    first = np.asarray(first)
+    return SignalExpression('crossed_below(first, second)').mask({
+        'first': first, 'second': np.broadcast_to(second, first.shape)})
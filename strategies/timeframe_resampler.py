@@ -0,0 +1,237 @@
+# Higher timeframes from the loaded base candles
+#
+# A 15m or 1h candle is derived from the 5m candles of config["timeframe"] instead of a
+# separate dataset: candles are bucketed by their open time (buckets start at multiples of
+# the timeframe since the epoch, weeks on Mondays, like the exchanges) and every bucket is
+# reduced in one pass with ufunc.reduceat. A bucket the data starts in the middle of is
+# dropped, its open would not be the real open.
+#
+# Results are cached per history and timeframe. When generate_indicators is called again
+# with more candles of the same history, only the last, possibly unfinished, bucket and the
+# new candles are resampled. The cached candles are only extended when the history still
+# has the row count, the first candle and a fingerprint of the last base candles they were
+# built from. Hashing only that tail keeps an update proportional to the new candles, and
+# histories that merely start alike (two pairs at the same price, a re-synced history) still
+# differ in it and are resampled from scratch.
+#
+# Informative indicators are computed on the higher timeframe and aligned to the base
+# candles without lookahead: a base candle only sees higher timeframe candles that have
+# closed by the end of that base candle. Strategies declare them per timeframe, e.g.
+#   informative_indicators = {'1h': [IndicatorNode('rsi', 'RSI', timeperiod=14)]}
+# and add_informative(dataframe, self.informative_indicators) adds the column "rsi_1h".
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from disk_cache import array_fingerprint
+from indicator_graph import IndicatorGraph
+from ohlcv_store import FIELDS
+from timeframes import timeframe_to_minutes
+
+_NANOSECONDS_PER_MINUTE = 60 * 10 ** 9
+# the epoch is a Thursday, weekly candles start on Mondays
+_WEEK_OFFSET = 4 * 24 * 60 * _NANOSECONDS_PER_MINUTE
+# base candles at the end of a cached history that are compared before it is extended
+_FINGERPRINT_ROWS = 16
+
+
+def bucket_starts(times, timeframe: str) -> np.ndarray:
+    """
+    :param times: candle open times in nanoseconds since the epoch
+    :type times: ndarray
+    :param timeframe: e.g. "1h"
+    :type timeframe: str
+    :return: open time of the timeframe candle every candle falls in
+    :rtype: ndarray
+    """
+    length = timeframe_to_minutes(timeframe) * _NANOSECONDS_PER_MINUTE
+    offset = _WEEK_OFFSET if timeframe.endswith('w') else 0
+    return (np.asarray(times, dtype=np.int64) - offset) // length * length + offset
+
+
+def resample_arrays(times, columns: dict, timeframe: str) -> tuple:
+    """
+    :param times: base candle open times in nanoseconds, ascending
+    :type times: ndarray
+    :param columns: open, high, low, close and volume arrays of the base candles
+    :type columns: dict
+    :param timeframe: e.g. "1h"
+    :type timeframe: str
+    :return: open times of the timeframe candles, their OHLCV arrays and the base row each one starts at
+    :rtype: tuple
+    """
+    buckets = bucket_starts(times, timeframe)
+    if len(buckets) == 0:
+        return buckets, {field: np.empty(0) for field in FIELDS}, np.empty(0, dtype=np.int64)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)]
+    resampled = {
+        'open': columns['open'][starts],
+        'high': np.maximum.reduceat(columns['high'], starts),
+        'low': np.minimum.reduceat(columns['low'], starts),
+        'close': columns['close'][ends - 1],
+        'volume': np.add.reduceat(columns['volume'], starts),
+    }
+    return buckets[starts], resampled, starts
+
+
+class Resampler:
+    """
+    Resamples base candles into higher timeframes and remembers the results per history.
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        # (timeframe, first candle time, first open) -> resampled history
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def resample(self, dataframe: DataFrame, timeframe: str) -> DataFrame:
+        """
+        :param dataframe: base candles with a DatetimeIndex
+        :type dataframe: DataFrame
+        :param timeframe: e.g. "1h", a multiple of the base timeframe
+        :type timeframe: str
+        :return: candles of the timeframe indexed by their open time, the last one may still be unfinished
+        :rtype: DataFrame
+        """
+        times = np.asarray(dataframe.index.values, dtype='datetime64[ns]').view(np.int64)
+        columns = {field: dataframe[field].to_numpy(dtype=float) for field in FIELDS}
+        if len(times) == 0:
+            return self._frame(times, columns)
+
+        key = (timeframe, int(times[0]), float(columns['open'][0]))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        # the cached history must be a prefix of this one
+        rows = entry['rows'] if entry is not None else 0
+        if entry is None or rows > len(times) or times[rows - 1] != entry['last_time'] \
+                or _tail_fingerprint(times, columns, rows) != entry['fingerprint']:
+            entry = {'times': np.empty(0, dtype=np.int64), 'columns': {field: np.empty(0) for field in FIELDS},
+                     'starts': np.empty(0, dtype=np.int64)}
+            first_row = 0
+        else:
+            # resample again from the start of the last bucket, it may have been unfinished
+            first_row = int(entry['starts'][-1]) if len(entry['starts']) else 0
+
+        if rows != len(times) or first_row == 0:
+            kept = np.searchsorted(entry['starts'], first_row, side='left')
+            new_times, new_columns, new_starts = resample_arrays(
+                times[first_row:], {field: values[first_row:] for field, values in columns.items()}, timeframe)
+            entry = {
+                'times': np.concatenate([entry['times'][:kept], new_times]),
+                'columns': {field: np.concatenate([entry['columns'][field][:kept], new_columns[field]])
+                            for field in FIELDS},
+                'starts': np.concatenate([entry['starts'][:kept], new_starts + first_row]),
+                'rows': len(times),
+                'last_time': times[-1],
+                'fingerprint': _tail_fingerprint(times, columns, len(times)),
+            }
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        result_times, result_columns = entry['times'], entry['columns']
+        # drop a first bucket the data starts in the middle of
+        if len(result_times) and times[0] != result_times[0]:
+            result_times = result_times[1:]
+            result_columns = {field: values[1:] for field, values in result_columns.items()}
+        return self._frame(result_times, result_columns)
+
+    @staticmethod
+    def _frame(times, columns) -> DataFrame:
+        index = pd.DatetimeIndex(np.asarray(times, dtype=np.int64).view('datetime64[ns]'), name='time')
+        return DataFrame({field: np.array(columns[field]) for field in FIELDS}, index=index)
+
+
+def _tail_fingerprint(times, columns: dict, rows: int) -> str:
+    """
+    :return: fingerprint of the last _FINGERPRINT_ROWS of the first rows base candles
+    """
+    first = max(0, rows - _FINGERPRINT_ROWS)
+    return array_fingerprint(times[first:rows], *(columns[field][first:rows] for field in FIELDS))
+
+
+RESAMPLER = Resampler()
+
+
+def align_informative(dataframe: DataFrame, informative: DataFrame, timeframe: str, base_timeframe: str = None) -> DataFrame:
+    """
+    :param dataframe: base candles
+    :type dataframe: DataFrame
+    :param informative: columns on the timeframe, indexed by candle open time
+    :type informative: DataFrame
+    :param timeframe: timeframe of informative, e.g. "1h"
+    :type timeframe: str
+    :param base_timeframe: timeframe of dataframe, e.g. config["timeframe"], taken from the candle spacing if None
+    :type base_timeframe: str
+    :return: per base candle the values of the last informative candle that closed by the end of the
+             base candle, NaN before the first one
+    :rtype: DataFrame
+    """
+    times = np.asarray(dataframe.index.values, dtype='datetime64[ns]').view(np.int64)
+    if base_timeframe is not None:
+        base = timeframe_to_minutes(base_timeframe) * _NANOSECONDS_PER_MINUTE
+    else:
+        base = int(np.diff(times).min()) if len(times) > 1 else 0
+
+    # an informative candle is known at its close, at the close of the base candle opened at
+    # its open time + its length - the base length
+    length = timeframe_to_minutes(timeframe) * _NANOSECONDS_PER_MINUTE
+    known = np.asarray(informative.index.values, dtype='datetime64[ns]').view(np.int64) + length - base
+    position = np.searchsorted(known, times, side='right') - 1
+
+    aligned = {}
+    for column in informative.columns:
+        values = informative[column].to_numpy(dtype=float)
+        aligned[column] = np.where(position >= 0, values[np.maximum(position, 0)], np.nan) \
+            if len(values) else np.full(len(times), np.nan)
+    return DataFrame(aligned, index=dataframe.index)
+
+
+def informative(dataframe: DataFrame, timeframe: str, nodes, base_timeframe: str = None,
+                resampler: Resampler = RESAMPLER) -> DataFrame:
+    """
+    :param dataframe: base candles
+    :type dataframe: DataFrame
+    :param timeframe: e.g. "1h"
+    :type timeframe: str
+    :param nodes: indicator nodes computed on the timeframe
+    :type nodes: list
+    :param base_timeframe: timeframe of dataframe, taken from the candle spacing if None
+    :type base_timeframe: str
+    :param resampler: where resampled candles are cached
+    :type resampler: Resampler
+    :return: the indicator columns aligned to the base candles, without lookahead
+    :rtype: DataFrame
+    """
+    graph = IndicatorGraph(nodes)
+    candles = graph.evaluate(resampler.resample(dataframe, timeframe))
+    columns = [column for outputs in graph.outputs.values() for names in outputs for column in names]
+    return align_informative(dataframe, candles[columns], timeframe, base_timeframe)
+
+
+def add_informative(dataframe: DataFrame, informative_indicators: dict, base_timeframe: str = None,
+                    resampler: Resampler = RESAMPLER) -> DataFrame:
+    """
+    :param dataframe: base candles
+    :type dataframe: DataFrame
+    :param informative_indicators: timeframe -> indicator nodes, e.g. {"1h": [IndicatorNode("rsi", "RSI")]}
+    :type informative_indicators: dict
+    :return: the same dataframe with a column "<column>_<timeframe>" per indicator output, e.g. "rsi_1h"
+    :rtype: DataFrame
+    """
+    for timeframe, nodes in informative_indicators.items():
+        aligned = informative(dataframe, timeframe, nodes, base_timeframe, resampler)
+        for column in aligned.columns:
+            dataframe[f'{column}_{timeframe}'] = aligned[column].to_numpy()
+    return dataframe
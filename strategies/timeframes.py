@@ -0,0 +1,16 @@
+# Timeframe strings as used in config.json, e.g. "5m", "1h" or "1d"
+
+_UNIT_MINUTES = {'m': 1, 'h': 60, 'd': 60 * 24, 'w': 60 * 24 * 7}
+
+
+def timeframe_to_minutes(timeframe: str) -> int:
+    """
+    :param timeframe: e.g. "5m", "4h", "1d" or "1w"
+    :type timeframe: str
+    :return: length of one candle in minutes
+    :rtype: int
+    """
+    amount, unit = timeframe[:-1], timeframe[-1:]
+    if unit not in _UNIT_MINUTES or not amount.isdigit() or int(amount) == 0:
+        raise ValueError(f"Unknown timeframe: {timeframe}")
+    return int(amount) * _UNIT_MINUTES[unit]
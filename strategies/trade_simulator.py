@@ -0,0 +1,191 @@
+# Vectorized trade simulation for one pair
+#
+# Resolves entries, stoploss hits and sell signals with array operations. Exits that do not
+# depend on the trade (sell signals and, with "stoploss-type": "dynamic", the per candle
+# stoploss column) are turned into a next-event index array once, so the simulation jumps
+# from entry to exit to the next entry instead of stepping through every candle. Exits that
+# depend on the entry price are only searched between the entry and that next event.
+#
+# Conventions: a trade is entered at the close of a candle with a buy signal and exits at
+# the close of a candle with a sell signal. The dynamic stoploss column is a price level set
+# at the close of a candle, it is hit during the next candle when its low reaches it, and
+# fills at that level, or at the open when the candle gaps below it. The ROI target of a
+# candle is hit when its high reaches it and fills the same way. When several exits fall on
+# one candle the stoploss goes first, then the ROI, then the sell signal. At most one trade
+# per pair is open at a time, a trade still open at the end is closed at the last close.
+
+import numpy as np
+from pandas import DataFrame
+
+from roi_table import RoiTable
+
+EXIT_SELL_SIGNAL = 'sell signal'
+EXIT_STOPLOSS = 'stoploss'
+EXIT_ROI = 'roi'
+EXIT_END_OF_DATA = 'end of data'
+
+
+def next_true(mask) -> np.ndarray:
+    """
+    :param mask: events per candle
+    :type mask: ndarray
+    :return: per candle the index of the first event at or after it, len(mask) if there is none
+    :rtype: ndarray
+    """
+    mask = np.asarray(mask, dtype=bool)
+    index = np.where(mask, np.arange(len(mask)), len(mask))
+    return np.minimum.accumulate(index[::-1])[::-1]
+
+
+def simulation_settings(config: dict) -> dict:
+    """
+    :param config: contents of config.json
+    :type config: dict
+    :return: keyword arguments for simulate_trades
+    :rtype: dict
+    """
+    return {
+        'stoploss_type': config.get('stoploss-type', 'standard'),
+        'stoploss': config.get('stoploss'),
+        'roi': config.get('roi'),
+        'timeframe': config.get('timeframe', '5m'),
+        'fee': config.get('fee', 0),
+    }
+
+
+def simulate_trades(dataframe: DataFrame, stoploss_type: str = 'dynamic', stoploss: float = None,
+                    roi=None, timeframe: str = '5m', fee: float = 0) -> DataFrame:
+    """
+    :param dataframe: candles with buy and sell signals, and a stoploss column for dynamic stops
+    :type dataframe: DataFrame
+    :param stoploss_type: "dynamic" to use the stoploss column as a price level, anything else for
+                          a fixed stoploss relative to the entry price
+    :type stoploss_type: str
+    :param stoploss: fixed stoploss in percent, e.g. -4, None for no fixed stoploss
+    :type stoploss: float
+    :param roi: ROI table, e.g. {"0": 7, "60": 6, "120": 5}, None for no ROI exits
+    :type roi: dict or RoiTable
+    :param timeframe: candle length, e.g. "5m", used to turn candles since entry into minutes
+    :type timeframe: str
+    :param fee: fee per order in percent, e.g. 0.25
+    :type fee: float
+    :return: one row per trade with entry and exit candle, prices, exit reason and profit ratio after fees
+    :rtype: DataFrame
+    """
+    length = len(dataframe)
+    buy = signal_mask(dataframe, 'buy')
+    sell = signal_mask(dataframe, 'sell')
+    low = dataframe['low'].to_numpy(dtype=float)
+    high = dataframe['high'].to_numpy(dtype=float)
+    open_ = dataframe['open'].to_numpy(dtype=float)
+    close = dataframe['close'].to_numpy(dtype=float)
+
+    # trade independent exits, the stoploss level of a candle applies to the next one
+    stop = np.full(length, np.nan)
+    if stoploss_type == 'dynamic':
+        stop[1:] = dataframe['stoploss'].to_numpy(dtype=float)[:-1]
+    stop_hit = low <= stop
+    next_exit = next_true(sell | stop_hit)
+    next_buy = next_true(buy)
+    fixed_stop = stoploss is not None and stoploss_type != 'dynamic'
+    if roi is not None and not isinstance(roi, RoiTable):
+        roi = RoiTable(roi)
+    # price multiple to reach per candle since entry, the last one holds from then on
+    roi_factors = 1 + roi.per_candle(timeframe) / 100 if roi is not None else None
+
+    entries, exits, exit_prices, reasons = [], [], [], []
+    entry = next_buy[0] if length else 0
+    while entry < length:
+        # first trade independent exit, then anything trade dependent before it
+        bound = next_exit[entry + 1] if entry + 1 < length else length
+        exit_index, reason, price = bound, None, None
+        end = min(bound + 1, length)
+
+        if fixed_stop:
+            level = close[entry] * (1 + stoploss / 100)
+            hits = np.flatnonzero(low[entry + 1:end] <= level)
+            if len(hits):
+                exit_index = entry + 1 + hits[0]
+                reason, price = EXIT_STOPLOSS, min(open_[exit_index], level)
+
+        if roi_factors is not None:
+            hit = _first_roi_hit(high, entry, min(exit_index + 1, end), close[entry] * roi_factors)
+            # a stoploss on the same candle goes first
+            if hit is not None and (hit < exit_index or (hit == exit_index and reason is None
+                                                          and not stop_hit[hit])):
+                target = close[entry] * roi_factors[min(hit - entry, len(roi_factors) - 1)]
+                exit_index, reason, price = hit, EXIT_ROI, max(open_[hit], target)
+
+        if reason is None:
+            if exit_index >= length:
+                exit_index, reason, price = length - 1, EXIT_END_OF_DATA, close[-1]
+            elif stop_hit[exit_index]:
+                reason, price = EXIT_STOPLOSS, min(open_[exit_index], stop[exit_index])
+            else:
+                reason, price = EXIT_SELL_SIGNAL, close[exit_index]
+
+        entries.append(entry)
+        exits.append(exit_index)
+        exit_prices.append(price)
+        reasons.append(reason)
+        entry = next_buy[exit_index + 1] if exit_index + 1 < length else length
+
+    return trades_frame(dataframe, np.array(entries, dtype=np.int64), np.array(exits, dtype=np.int64),
+                   np.array(exit_prices, dtype=float), reasons, fee)
+
+
+def _first_roi_hit(high, entry, end, targets):
+    """
+    :param targets: price to reach per candle since entry, the last one holds from then on
+    :return: first candle in entry + 1 .. end - 1 whose high reaches its target, None if there is none
+    """
+    # candles with their own target, then the candles at the last target
+    split = min(entry + len(targets), end)
+    hits = np.flatnonzero(high[entry + 1:split] >= targets[1:split - entry])
+    if len(hits):
+        return entry + 1 + hits[0]
+    hits = np.flatnonzero(high[split:end] >= targets[-1])
+    return split + hits[0] if len(hits) else None
+
+
+def signal_mask(dataframe: DataFrame, column: str) -> np.ndarray:
+    """
+    :param dataframe: candles with signals
+    :type dataframe: DataFrame
+    :param column: e.g. "buy"
+    :type column: str
+    :return: True on the candles where the signal is set, all False if there is no such column
+    :rtype: ndarray
+    """
+    if column not in dataframe:
+        return np.zeros(len(dataframe), dtype=bool)
+    # old style float columns are 1 where set and NaN elsewhere
+    return np.nan_to_num(dataframe[column].to_numpy(dtype=float)) == 1
+
+
+def trades_frame(dataframe: DataFrame, entries, exits, exit_prices, reasons, fee: float) -> DataFrame:
+    """
+    :param dataframe: candles the trades were simulated on
+    :type dataframe: DataFrame
+    :param entries: entry candle per trade
+    :param exits: exit candle per trade
+    :param exit_prices: exit price per trade
+    :param reasons: exit reason per trade, e.g. EXIT_ROI
+    :param fee: fee per order in percent
+    :type fee: float
+    :return: one row per trade, as returned by simulate_trades
+    :rtype: DataFrame
+    """
+    entry_prices = dataframe['close'].to_numpy(dtype=float)[entries]
+    fee = fee / 100
+    return DataFrame({
+        'entry_index': entries,
+        'exit_index': exits,
+        'entry_time': dataframe.index[entries],
+        'exit_time': dataframe.index[exits],
+        'entry_price': entry_prices,
+        'exit_price': exit_prices,
+        'exit_reason': reasons,
+        # fee is paid on the amount bought and on the amount sold
+        'profit_ratio': exit_prices * (1 - fee) / (entry_prices * (1 + fee)) - 1,
+    })
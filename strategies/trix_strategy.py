@@ -2,7 +2,8 @@
 from pandas import DataFrame
 
 # Optional Imports
-import talib.abstract as ta
+from indicator_graph import COMMON_INDICATORS, IndicatorGraph, IndicatorNode
+from signal_expressions import SignalExpression
 
 from backtesting.strategy import Strategy
 
@@ -12,6 +13,24 @@ class TrixStrategy(Strategy):
     This is an example custom strategy for advanced users, that inherits from the main Strategy class
     """
 
+    indicators = COMMON_INDICATORS + [
+        # TRIX
+        IndicatorNode('trix', 'TRIX', timeperiod=21),
+    ]
+
+    buy_conditions = SignalExpression("""
+        (rsi < 30) &
+        (volume > 0) &
+        (trix < 0) & (prev(trix) > 0)
+    """)
+
+    sell_conditions = SignalExpression("""
+        (rsi > 70) &
+        (ema5 < ema21) &
+        (volume > 0) &
+        (trix > 0) & (prev(trix) < 0)
+    """)
+
     def generate_indicators(self, dataframe: DataFrame) -> DataFrame:
         """
         :param dataframe: All passed candles (current candle included!) with OHLCV data
@@ -19,15 +38,7 @@ class TrixStrategy(Strategy):
         :return: Dataframe filled with indicator-data
         :rtype: DataFrame
         """
-        # RSI - Relative Strength Index
-        dataframe['rsi'] = ta.RSI(dataframe, timeperiod=14)
-        # EMA - Exponential Moving Average
-        dataframe['ema5'] = ta.EMA(dataframe, timeperiod=5)
-        dataframe['ema21'] = ta.EMA(dataframe, timeperiod=21)
-        # ATR - Average True Range
-        dataframe['atr'] = ta.ATR(dataframe['high'], dataframe['low'], dataframe['close'], timeperiod=14)
-        # TRIX
-        dataframe['trix'] = ta.TRIX(dataframe, timeperiod=21)
+        dataframe = IndicatorGraph(self.indicators).evaluate(dataframe)
 
         print(dataframe)
 
@@ -42,13 +53,7 @@ class TrixStrategy(Strategy):
         """
         # BEGIN STRATEGY
 
-        dataframe.loc[
-            (
-                (dataframe['rsi'] < 30) &
-                (dataframe['volume'] > 0) &
-                (dataframe['trix'] < 0) & (dataframe.shift(1)['trix'] > 0)
-            ),
-            'buy'] = 1
+        dataframe['buy'] = self.buy_conditions.evaluate(dataframe)
 
         # END STRATEGY
 
@@ -63,14 +68,7 @@ class TrixStrategy(Strategy):
         """
         # BEGIN STRATEGY
 
-        dataframe.loc[
-            (
-                (dataframe['rsi'] > 70) &
-                (dataframe['ema5'] < dataframe['ema21']) &
-                (dataframe['volume'] > 0) &
-                (dataframe['trix'] > 0) & (dataframe.shift(1)['trix'] < 0)
-            ),
-            'sell'] = 1
+        dataframe['sell'] = self.sell_conditions.evaluate(dataframe)
 
         # END STRATEGY
 
@@ -0,0 +1,5 @@
+# The strategy modules import each other by bare name, as in the engine's strategies volume
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'strategies'))
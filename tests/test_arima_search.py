@@ -0,0 +1,24 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from arima_search import seasonal_order_search
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_early_cutoff_picks_the_exhaustive_order(seed):
+    random = np.random.default_rng(seed)
+    length, m = 160, 4
+    # seasonal ARMA noise on a trend with a weekly pattern
+    noise = np.zeros(length)
+    shocks = random.normal(size=length)
+    for t in range(length):
+        noise[t] = shocks[t] + 0.5 * (noise[t - 1] if t >= 1 else 0) + 0.4 * (noise[t - m] if t >= m else 0)
+    y = pd.Series(100 + 0.05 * np.arange(length) + 2 * np.sin(2 * np.pi * np.arange(length) / m) + noise)
+
+    search = dict(m=m, d=1, D=1, max_p=2, max_q=2, max_P=1, max_Q=1, max_order=4, max_workers=2)
+    exact = seasonal_order_search(y, **search)
+    cut = seasonal_order_search(y, early_cutoff=True, **search)
+
+    assert (cut.order, cut.seasonal_order) == (exact.order, exact.seasonal_order)
+    assert cut.aic() == pytest.approx(exact.aic())
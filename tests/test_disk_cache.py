@@ -0,0 +1,20 @@
+import os
+
+import disk_cache
+from disk_cache import DiskCache
+
+
+def test_get_returns_value_evicted_after_loading(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path))
+    cache.set('key', {'order': (1, 1, 1)})
+    load = disk_cache.pickle.load
+
+    def load_then_evict(file):
+        value = load(file)
+        # another process evicts the entry between the read and the touch
+        os.remove(file.name)
+        return value
+
+    monkeypatch.setattr(disk_cache.pickle, 'load', load_then_evict)
+    assert cache.get('key') == {'order': (1, 1, 1)}
+    assert not os.path.exists(os.path.join(str(tmp_path), 'key' + DiskCache.suffix))
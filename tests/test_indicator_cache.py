@@ -0,0 +1,50 @@
+import os
+
+import pytest
+
+import indicator_cache
+import parameter_sweep
+from disk_cache import DiskCache
+from indicator_cache import IndicatorCache, cached_indicator
+from test_parallel_backtest import make_candles
+
+
+def stored(directory):
+    return [name for name in os.listdir(directory) if name.endswith(DiskCache.suffix)] \
+        if os.path.isdir(directory) else []
+
+
+def test_memory_only_keeps_the_disk_tier_untouched(tmp_path):
+    cache = IndicatorCache(disk=DiskCache(str(tmp_path)))
+    candles = make_candles(300, 0)
+
+    with cache.memory_only():
+        first = cached_indicator('RSI', candles, cache=cache, timeperiod=14)
+        assert cached_indicator('RSI', candles, cache=cache, timeperiod=14).equals(first)
+    assert cache.persist
+    assert stored(tmp_path) == []
+
+    cached_indicator('EMA', candles, cache=cache, timeperiod=5)
+    assert len(stored(tmp_path)) == 1
+
+
+def test_memory_only_does_not_read_the_disk_tier(tmp_path, monkeypatch):
+    candles = make_candles(300, 1)
+    cached_indicator('RSI', candles, cache=IndicatorCache(disk=DiskCache(str(tmp_path))), timeperiod=14)
+
+    def read(key):
+        pytest.fail(f"disk tier read for {key}")
+
+    cache = IndicatorCache(disk=DiskCache(str(tmp_path)), persist=False)
+    monkeypatch.setattr(cache.disk, 'get', read)
+    cached_indicator('RSI', candles, cache=cache, timeperiod=14)
+
+
+def test_sweep_workers_only_use_the_memory_tier(tmp_path, monkeypatch):
+    cache = IndicatorCache(disk=DiskCache(str(tmp_path)))
+    monkeypatch.setattr(indicator_cache, 'INDICATOR_CACHE', cache)
+
+    parameter_sweep._start_worker(1024)
+    cached_indicator('RSI', make_candles(300, 2), cache=cache, timeperiod=14)
+    assert cache.max_entries == 1024
+    assert stored(tmp_path) == []
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+import talib
+
+from indicator_kernels import atr, bbands, ema, ewm_mean, linear_recurrence, rsi
+
+
+def prices_with_gaps(seed):
+    generator = np.random.default_rng(seed)
+    values = 100 + np.cumsum(generator.normal(size=(4, 2000)), axis=1)
+    values[0, :30] = np.nan  # warm-up of an indicator
+    values[1, [200, 201, 202, 900, 1999]] = np.nan  # missing candles
+    values[2, :5] = np.nan
+    values[2, generator.integers(5, 2000, 150)] = np.nan
+    values[3, -10:] = np.nan  # delisted pair
+    return values
+
+
+@pytest.mark.parametrize('adjust', [True, False])
+@pytest.mark.parametrize('alpha', [1 / 14, 0.1, 0.3, 1.0])
+def test_ewm_mean_matches_pandas_with_nan(alpha, adjust):
+    values = prices_with_gaps(0)
+    expected = np.array([pd.Series(row).ewm(alpha=alpha, adjust=adjust).mean().to_numpy() for row in values])
+    np.testing.assert_allclose(ewm_mean(values, alpha, adjust), expected, rtol=1e-10)
+    np.testing.assert_allclose(ewm_mean(values[1], alpha, adjust), expected[1], rtol=1e-10)
+
+
+def test_linear_recurrence_starts_at_first_value():
+    values = np.array([[np.nan, np.nan, 1.0, 2.0, 3.0], [1.0, 2.0, 3.0, 4.0, 5.0]])
+    result = linear_recurrence(values, 0.5, initial=[4.0, 0.0])
+    np.testing.assert_allclose(result[0], [np.nan, np.nan, 3.0, 3.5, 4.75])
+    np.testing.assert_allclose(result[1], linear_recurrence(values[1], 0.5))
+
+
+@pytest.mark.parametrize('value', [np.nan, np.inf])
+def test_linear_recurrence_rejects_gaps(value):
+    values = np.arange(10.0)
+    values[5] = value
+    with pytest.raises(ValueError):
+        linear_recurrence(values, 0.5)
+
+
+def candle_rows(seed):
+    generator = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(generator.normal(0, 0.004, (4, 1500)), axis=1))
+    high = close * (1 + np.abs(generator.normal(0, 0.002, close.shape)))
+    low = close * (1 - np.abs(generator.normal(0, 0.002, close.shape)))
+    for values in (close, high, low):
+        values[1, :40] = np.nan  # pair listed later
+        values[2, :1490] = np.nan  # too short for a seed
+    return high, low, close
+
+
+@pytest.mark.parametrize('timeperiod', [3, 5, 14, 21])
+def test_kernels_match_talib_per_row(timeperiod):
+    high, low, close = candle_rows(1)
+    cases = [
+        (ema(close, timeperiod), [talib.EMA(row, timeperiod) for row in close]),
+        (rsi(close, timeperiod), [talib.RSI(row, timeperiod) for row in close]),
+        (atr(high, low, close, timeperiod), [talib.ATR(*rows, timeperiod) for rows in zip(high, low, close)]),
+    ]
+    bands = bbands(close, timeperiod, 2.0, 1.5)
+    expected = [talib.BBANDS(row, timeperiod, 2.0, 1.5) for row in close]
+    cases.extend((bands[output], [row[output] for row in expected]) for output in range(3))
+    for result, rows in cases:
+        np.testing.assert_allclose(result, np.array(rows), rtol=1e-9)
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from parallel_backtest import backtest_config
+from trade_simulator import simulate_trades, simulation_settings
+
+
+def make_candles(rows, seed, start='2021-03-01'):
+    generator = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(generator.normal(0, 0.004, rows)))
+    open_ = np.r_[close[0], close[:-1]] * (1 + generator.normal(0, 0.001, rows))
+    high = np.maximum(open_, close) * (1 + np.abs(generator.normal(0, 0.002, rows)))
+    low = np.minimum(open_, close) * (1 - np.abs(generator.normal(0, 0.002, rows)))
+    index = pd.date_range(start, periods=rows, freq='5min', name='time')
+    return pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close,
+                         'volume': generator.integers(0, 1000, rows).astype(float)}, index=index)
+
+
+class RandomSignals:
+    """
+    Buy and sell signals and a trailing stoploss column drawn from the candles.
+    """
+
+    def generate_indicators(self, dataframe):
+        dataframe = dataframe.copy()
+        dataframe['draw'] = (dataframe['close'].to_numpy() * 1e6) % 1
+        return dataframe
+
+    def buy_signal(self, dataframe):
+        dataframe['buy'] = (dataframe['draw'] < 0.15).astype(float)
+        return dataframe
+
+    def sell_signal(self, dataframe):
+        dataframe['sell'] = (dataframe['draw'] > 0.95).astype(float)
+        return dataframe
+
+    def stoploss(self, dataframe):
+        dataframe['stoploss'] = dataframe['low'].rolling(12, min_periods=1).min() * 0.998
+        return dataframe
+
+
+def serial_backtest(strategy, dataframes, config):
+    """
+    Steps through the candles of all pairs at once, one open trade per pair and at most
+    "max-open-trades" open trades.
+    """
+    settings = simulation_settings(config)
+    max_open_trades = config['max-open-trades']
+    frames = {}
+    for pair, dataframe in dataframes.items():
+        dataframe = strategy.sell_signal(strategy.buy_signal(strategy.generate_indicators(dataframe)))
+        frames[pair] = strategy.stoploss(dataframe)
+
+    free = config['starting-capital']
+    open_trades, last_exit, taken = [], {}, []
+    times = sorted(set().union(*(frame.index for frame in frames.values())))
+    for time in times:
+        for trade in [trade for trade in open_trades if trade['exit_time'] <= time]:
+            open_trades.remove(trade)
+            free += trade['stake_amount'] * (1 + trade['profit_ratio'])
+        for pair, frame in frames.items():
+            if len(open_trades) >= max_open_trades:
+                break
+            if time not in frame.index or frame.at[time, 'buy'] != 1 \
+                    or (pair in last_exit and time <= last_exit[pair]):
+                continue
+            # the trade of this buy candle alone
+            single = frame.copy()
+            single['buy'] = (single.index == time).astype(float)
+            trade = simulate_trades(single, **settings).iloc[0].to_dict()
+            trade['pair'] = pair
+            trade['stake_amount'] = free / (max_open_trades - len(open_trades))
+            free -= trade['stake_amount']
+            last_exit[pair] = trade['exit_time']
+            open_trades.append(trade)
+            taken.append(trade)
+    return pd.DataFrame(taken)
+
+
+@pytest.mark.parametrize('exits', [
+    {'stoploss-type': 'standard', 'stoploss': -1, 'roi': {'0': 2, '60': 1}},
+    {'stoploss-type': 'dynamic', 'roi': {'0': 1.5}},
+])
+def test_backtest_config_matches_serial_portfolio(exits):
+    dataframes = {'ETH/USDT': make_candles(600, 1), 'BTC/USDT': make_candles(600, 2),
+                  'ADA/USDT': make_candles(500, 3, start='2021-03-01 08:20'),
+                  'XRP/USDT': make_candles(600, 4)}
+    config = {'max-open-trades': 2, 'starting-capital': 1000, 'fee': 0.25, 'timeframe': '5m', **exits}
+
+    merged = backtest_config(RandomSignals(), dataframes, config, max_workers=2)
+    expected = serial_backtest(RandomSignals(), dataframes, config)
+
+    assert len(expected) > 20
+    assert merged['pair'].tolist() == expected['pair'].tolist()
+    for column in ('entry_time', 'exit_time', 'exit_reason'):
+        assert merged[column].tolist() == expected[column].tolist()
+    np.testing.assert_allclose(merged['exit_price'], expected['exit_price'])
+    np.testing.assert_allclose(merged['stake_amount'], expected['stake_amount'])